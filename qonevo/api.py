@@ -2,6 +2,7 @@ import frappe
 from frappe import _
 import json
 from datetime import datetime, timedelta
+from qonevo import tracing
 
 @frappe.whitelist()
 def get_status_counts():
@@ -27,7 +28,7 @@ def get_status_counts():
 def get_list_data(doctype="HD Ticket", filters=None, **kwargs):
     """Get list data with custom filters and OR logic - Direct API endpoint"""
     try:
-        print(f"QONEVO API: Received doctype={doctype}, filters={filters}, kwargs={kwargs}")
+        tracing.debug("Received doctype=%s, filters=%s, kwargs=%s", doctype, filters, kwargs)
         
         # Handle filters parameter
         if isinstance(filters, str):
@@ -223,7 +224,7 @@ def call_original_get_list_data(doctype, filters, **kwargs):
                     filtered_kwargs[key] = value
         
         result = original_get_list_data(doctype, filters, **filtered_kwargs)
-        print(f"QONEVO API: Original API returned {len(result.get('data', []))} tickets")
+        tracing.debug("Original API returned %s tickets", len(result.get('data', [])))
         return result
     except ImportError:
         # Fallback if original method is not available
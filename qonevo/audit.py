@@ -0,0 +1,40 @@
+# Copyright (c) 2026, Qonevo and contributors
+# For license information, please see license.txt
+
+"""
+Audit comments for set-based updates.
+
+Bulk updates skip ``Document.save`` and with it the timeline entries Frappe would
+write. ``add_audit_comments`` records one Info comment per changed document with
+a single bulk insert instead.
+"""
+
+import frappe
+from frappe.utils import now
+
+AUDIT_COMMENT_FIELDS = (
+    "name", "comment_type", "reference_doctype", "reference_name", "content",
+    "comment_email", "creation", "modified", "owner", "modified_by", "docstatus",
+)
+
+
+def add_audit_comments(doctype, contents, timestamp=None):
+    """
+    Bulk insert one Info comment per document
+
+    Does not commit; the caller's transaction owns the comments.
+
+    Args:
+        doctype (str): DocType of the commented documents
+        contents (dict): document name -> comment text
+        timestamp (str): creation and modified of the comments (default: now)
+    """
+    if not contents:
+        return
+
+    timestamp = timestamp or now()
+    user = frappe.session.user
+    frappe.db.bulk_insert("Comment", AUDIT_COMMENT_FIELDS, [(
+        frappe.generate_hash(length=10), "Info", doctype, name, content,
+        user, timestamp, timestamp, user, user, 0,
+    ) for name, content in contents.items()])
@@ -1,14 +1,21 @@
 # Copyright (c) 2025, Qonevo and contributors
 # For license information, please see license.txt
 
-import frappe
-import json
 import base64
-from frappe import _
-from frappe.utils import cint, flt
+import json
+from io import BytesIO
+
 import barcode
+import frappe
 from barcode.writer import ImageWriter
-from io import BytesIO
+from frappe import _
+from frappe.utils import cint, flt
+
+from qonevo.item_cache import get_item_attributes, get_item_attributes_map
+from qonevo.qonevo.doctype.barcode_registry.barcode_registry import resolve_barcodes
+
+# Upper bound on barcodes accepted by one batch scan request
+MAX_SCAN_BATCH_SIZE = 500
 
 
 class BarcodeUtils:
@@ -30,23 +37,24 @@ class BarcodeUtils:
         """
         try:
             # Get item details
-            item_doc = frappe.get_doc("Item", item_code)
-            model_number = model_number or item_doc.get("default_manufacturer_part_no") or ""
+            item = get_item_attributes(item_code)
+            if not item:
+                return {
+                    "success": False,
+                    "error": f"Item {item_code} not found"
+                }
+            model_number = model_number or item.get("default_manufacturer_part_no") or ""
             
             # Create structured barcode data
             barcode_data = {
                 "item_code": item_code,
                 "model_number": model_number,
                 "serial_number": serial_number,
-                "item_name": item_doc.item_name,
+                "item_name": item.item_name,
                 "barcode_type": barcode_type
             }
             
-            # Create barcode string (item_code|model_number|serial_number)
-            if serial_number:
-                barcode_string = f"{item_code}|{model_number}|{serial_number}" if model_number else f"{item_code}||{serial_number}"
-            else:
-                barcode_string = f"{item_code}|{model_number}" if model_number else item_code
+            barcode_string = BarcodeUtils.build_barcode_string(item_code, model_number, serial_number)
             
             # Generate barcode image
             barcode_image = BarcodeUtils._generate_barcode_image(barcode_string, barcode_type)
@@ -68,6 +76,13 @@ class BarcodeUtils:
                 "error": str(e)
             }
     
+    @staticmethod
+    def build_barcode_string(item_code, model_number=None, serial_number=None):
+        """Build the barcode string (item_code|model_number|serial_number) without rendering an image"""
+        if serial_number:
+            return f"{item_code}|{model_number}|{serial_number}" if model_number else f"{item_code}||{serial_number}"
+        return f"{item_code}|{model_number}" if model_number else item_code
+
     @staticmethod
     def _generate_barcode_image(barcode_string, barcode_type="CODE128"):
         """Generate barcode image as base64 string"""
@@ -99,6 +114,20 @@ class BarcodeUtils:
             frappe.log_error(f"Error generating barcode image: {str(e)}")
             return None
     
+    @staticmethod
+    def parse_barcode_string(barcode_string):
+        """Split a barcode string (format: item_code|model_number|serial_number) into its parts"""
+        if "|" in barcode_string:
+            parts = barcode_string.split("|")
+            item_code = parts[0]
+            model_number = parts[1] if len(parts) > 1 and parts[1] else ""
+            serial_number = parts[2] if len(parts) > 2 and parts[2] else ""
+        else:
+            item_code = barcode_string
+            model_number = ""
+            serial_number = ""
+        return item_code, model_number, serial_number
+
     @staticmethod
     def scan_barcode(barcode_string):
         """
@@ -110,54 +139,113 @@ class BarcodeUtils:
         Returns:
             dict: Item information extracted from barcode
         """
+        return BarcodeUtils.scan_barcodes([barcode_string])[0]
+
+    @staticmethod
+    def scan_barcodes(barcode_strings):
+        """
+        Scan many barcodes in one pass with shared item and serial prefetching
+
+        Args:
+            barcode_strings (list): Scanned barcode strings
+
+        Returns:
+            list: Scan result for each barcode string, in input order
+        """
         try:
-            # Parse barcode string (format: item_code|model_number|serial_number)
-            if "|" in barcode_string:
-                parts = barcode_string.split("|")
-                item_code = parts[0]
-                model_number = parts[1] if len(parts) > 1 and parts[1] else ""
-                serial_number = parts[2] if len(parts) > 2 and parts[2] else ""
-            else:
-                item_code = barcode_string
-                model_number = ""
-                serial_number = ""
+            # Registered barcodes (item barcodes, serials and generated strings)
+            # resolve with a single indexed lookup
+            entries = resolve_barcodes(barcode_strings)
             
-            # Validate item exists
-            if not frappe.db.exists("Item", item_code):
-                return {
-                    "success": False,
-                    "error": f"Item {item_code} not found"
-                }
+            # Unregistered strings fall back to parsing the custom format
+            parsed = {}
+            for barcode_string in barcode_strings:
+                if barcode_string and barcode_string not in entries:
+                    parsed[barcode_string] = BarcodeUtils.parse_barcode_string(barcode_string)
             
-            # Get item details
-            item_doc = frappe.get_doc("Item", item_code)
-            
-            # Verify model number if provided
-            if model_number and item_doc.get("default_manufacturer_part_no") != model_number:
-                frappe.logger().warning(f"Model number mismatch for item {item_code}: barcode={model_number}, item={item_doc.get('default_manufacturer_part_no')}")
+            items = {}
+            serials = {}
+            if parsed:
+                item_codes = list({item_code for item_code, _model, _serial in parsed.values()})
+                items = get_item_attributes_map(item_codes)
+
+                serial_numbers = list({serial for _item, _model, serial in parsed.values() if serial})
+                if serial_numbers:
+                    serials = {serial.name: serial for serial in frappe.get_all("Serial No",
+                        filters={"name": ["in", serial_numbers]},
+                        fields=["name", "item_code", "batch_no"]
+                    )}
             
+        except Exception as e:
+            frappe.log_error(f"Error scanning barcodes {barcode_strings}: {str(e)}")
+            return [{"success": False, "error": str(e)} for _barcode in barcode_strings]
+
+        results = []
+        for barcode_string in barcode_strings:
+            if not barcode_string:
+                results.append({"success": False, "error": "Empty barcode"})
+            elif barcode_string in entries:
+                results.append(BarcodeUtils._build_scan_result(barcode_string, entries[barcode_string]))
+            else:
+                results.append(BarcodeUtils._scan_unregistered(barcode_string, parsed[barcode_string], items, serials))
+
+        return results
+
+    @staticmethod
+    def _scan_unregistered(barcode_string, parts, items, serials):
+        """Resolve a parsed, unregistered barcode against prefetched items and serials"""
+        item_code, _model_number, serial_number = parts
+
+        item = items.get(item_code)
+        if not item:
             return {
-                "success": True,
-                "item_code": item_code,
-                "model_number": model_number,
-                "serial_number": serial_number,
-                "item_name": item_doc.item_name,
-                "item_group": item_doc.item_group,
-                "stock_uom": item_doc.stock_uom,
-                "description": item_doc.description,
-                "brand": item_doc.brand,
-                "standard_rate": item_doc.standard_rate,
-                "is_stock_item": item_doc.is_stock_item,
-                "has_serial_no": item_doc.has_serial_no,
-                "has_batch_no": item_doc.has_batch_no
+                "success": False,
+                "error": f"Item {item_code} not found"
             }
-            
-        except Exception as e:
-            frappe.log_error(f"Error scanning barcode {barcode_string}: {str(e)}")
+
+        serial = serials.get(serial_number) if serial_number else None
+        if serial and serial.item_code != item_code:
             return {
                 "success": False,
-                "error": str(e)
+                "error": f"Serial number {serial_number} belongs to item {serial.item_code}, not {item_code}"
             }
+
+        entry = item
+        entry.update({
+            "item_code": item_code,
+            "serial_no": serial.name if serial else None,
+            "batch_no": serial.batch_no if serial else None,
+            "uom": item.stock_uom,
+        })
+        return BarcodeUtils._build_scan_result(barcode_string, entry)
+
+    @staticmethod
+    def _build_scan_result(barcode_string, entry):
+        """Build the scan response from a registry entry or item row"""
+        _item_code, model_number, serial_number = BarcodeUtils.parse_barcode_string(barcode_string)
+
+        item_model_number = entry.get("default_manufacturer_part_no")
+        if model_number and item_model_number and item_model_number != model_number:
+            frappe.logger().warning(f"Model number mismatch for item {entry.item_code}: barcode={model_number}, item={item_model_number}")
+
+        return {
+            "success": True,
+            "item_code": entry.item_code,
+            "model_number": model_number or item_model_number or "",
+            "serial_number": entry.serial_no or serial_number or "",
+            "serial_no_exists": bool(entry.serial_no),
+            "batch_no": entry.batch_no or "",
+            "uom": entry.uom,
+            "item_name": entry.item_name,
+            "item_group": entry.item_group,
+            "stock_uom": entry.stock_uom,
+            "description": entry.description,
+            "brand": entry.brand,
+            "standard_rate": entry.get("standard_rate"),
+            "is_stock_item": entry.is_stock_item,
+            "has_serial_no": entry.has_serial_no,
+            "has_batch_no": entry.has_batch_no
+        }
     
     @staticmethod
     def get_item_by_barcode(barcode_string):
@@ -178,7 +266,7 @@ class BarcodeUtils:
                     "item_code": result["item_code"],
                     "item_name": result["item_name"],
                     "barcode": barcode_string,
-                    "uom": result["stock_uom"],
+                    "uom": result["uom"],
                     "serial_number": result.get("serial_number", ""),
                     "model_number": result.get("model_number", "")
                 }
@@ -261,6 +349,36 @@ def scan_item_barcode(barcode_string):
         }
 
 
+@frappe.whitelist()
+def scan_item_barcodes(barcode_strings):
+    """
+    API endpoint for scanning a batch of barcodes, results are returned in input order
+
+    Entries that are not strings get an "Invalid barcode" result instead of failing the batch.
+    """
+    if isinstance(barcode_strings, str):
+        try:
+            barcode_strings = json.loads(barcode_strings)
+        except ValueError:
+            barcode_strings = None
+
+    if not isinstance(barcode_strings, list):
+        frappe.throw(_("Barcodes must be passed as a list of strings"))
+
+    if len(barcode_strings) > MAX_SCAN_BATCH_SIZE:
+        frappe.throw(_("Cannot scan more than {0} barcodes in one request").format(MAX_SCAN_BATCH_SIZE))
+
+    # None counts as an empty scan, like an empty string
+    barcode_strings = ["" if barcode_string is None else barcode_string for barcode_string in barcode_strings]
+    valid = [barcode_string.strip() for barcode_string in barcode_strings if isinstance(barcode_string, str)]
+    scanned = iter(BarcodeUtils.scan_barcodes(valid) if valid else [])
+
+    return [
+        next(scanned) if isinstance(barcode_string, str) else {"success": False, "error": "Invalid barcode"}
+        for barcode_string in barcode_strings
+    ]
+
+
 @frappe.whitelist()
 def get_item_by_barcode(barcode_string):
     """API endpoint for getting item by barcode (ERPNext compatible)"""
@@ -0,0 +1,26 @@
+# Copyright (c) 2026, Qonevo and contributors
+# For license information, please see license.txt
+
+"""
+Helpers for set-based SQL writes.
+"""
+
+import frappe
+
+
+def execute_and_count(query, values=None):
+    """
+    Run an UPDATE or DELETE and return the number of rows it changed
+
+    ``frappe.db.sql`` returns no row count for writes. The count is read from the
+    cursor right after the statement, before any other query can replace it.
+
+    Args:
+        query (str): SQL statement
+        values: Query parameters, as for frappe.db.sql
+
+    Returns:
+        int: rows changed by the statement
+    """
+    frappe.db.sql(query, values)
+    return max(getattr(frappe.db._cursor, "rowcount", 0) or 0, 0)
@@ -1,121 +1,81 @@
 # Copyright (c) 2025, Qonevo and contributors
 # For license information, please see license.txt
 
+import json
+
 import frappe
 from frappe import _
 
+from qonevo import tracing
+from qonevo.hook_metrics import instrumented
+from qonevo.serial_allocation import (
+    allocate_serials,
+    get_delivery_note_serial_index,
+    get_delivery_note_serials,
+)
+from qonevo.serial_bundle_writer import rewrite_bundle_entries
+
+# Upper bound on Delivery Note lines accepted by populate_manufacturing_serials
+MAX_POPULATE_ITEMS = 500
+
 
+@instrumented()
+@tracing.traced()
 def delivery_note_on_load(doc, method):
     """
     Hook to populate serial numbers from Sales Order's custom_manufactured_serials
     when creating a Delivery Note from Sales Order.
     """
-    print(f"🔧 DELIVERY NOTE HOOK: delivery_note_on_load triggered for {doc.name}")
-    
     # Check if any item has a sales order reference
-    has_sales_order = False
-    sales_orders_found = []
-    
-    for item in doc.items:
-        if item.against_sales_order:
-            has_sales_order = True
-            sales_orders_found.append(item.against_sales_order)
-            print(f"📦 DELIVERY NOTE HOOK: Item {item.item_code} linked to Sales Order {item.against_sales_order}")
-    
-    if not has_sales_order:
-        print(f"⚠️ DELIVERY NOTE HOOK: No items with sales order references found in {doc.name}")
+    if not any(item.against_sales_order for item in doc.items):
+        tracing.debug("No items with sales order references found in %s", doc.name)
         return
     
-    print(f"📋 DELIVERY NOTE HOOK: Found {len(sales_orders_found)} items with sales order references: {sales_orders_found}")
-    
     try:
-        print(f"🔍 DELIVERY NOTE HOOK: Processing {len(doc.items)} items in Delivery Note {doc.name}")
+        tracing.debug("Processing %s items in Delivery Note %s", len(doc.items), doc.name)
         
-        # Process each item in the Delivery Note
-        for i, item in enumerate(doc.items):
-            print(f"📦 DELIVERY NOTE HOOK: Processing item {i+1}: {item.item_code}")
-            
-            if not item.against_sales_order:
-                print(f"⏭️ DELIVERY NOTE HOOK: Item {item.item_code} has no sales order reference, skipping")
-                continue
-                
-            print(f"📋 DELIVERY NOTE HOOK: Getting Sales Order {item.against_sales_order}")
-            # Get the Sales Order for this item
-            sales_order = frappe.get_doc("Sales Order", item.against_sales_order)
-            print(f"📋 DELIVERY NOTE HOOK: Sales Order {sales_order.name} found, Customer: {sales_order.customer}")
-            
-            # Check if Sales Order has manufacturing serials
-            if not hasattr(sales_order, 'custom_manufactured_serials') or not sales_order.custom_manufactured_serials:
-                print(f"⚠️ DELIVERY NOTE HOOK: Sales Order {sales_order.name} has no manufacturing serials, skipping")
+        # Serials already on each line, bundle entries included, so lines that
+        # still hold valid serials keep them
+        current_serials = get_delivery_note_serials(doc)
+        
+        # Allocate across all lines at once so serials delivered by earlier notes,
+        # reserved by other drafts or taken by earlier lines are skipped
+        allocations = allocate_serials(
+            [get_allocation_line(item, serial_nos=current_serials.get(item.name, [])) for item in doc.items],
+            delivery_note=doc.name,
+            lock=True
+        )
+        
+        for item in doc.items:
+            allocation = allocations.get(item.name)
+            if not allocation:
                 continue
             
-            print(f"✅ DELIVERY NOTE HOOK: Sales Order {sales_order.name} has {len(sales_order.custom_manufactured_serials)} manufacturing serials")
+            item_code = item.item_code
+            selected_serials = allocation["serial_nos"]
+            tracing.debug("Item %s requires %s, %s serials available", item_code, allocation['required'], allocation['available'])
             
-            # Create a mapping of item_code to serial numbers for this Sales Order
-            print(f"🗺️ DELIVERY NOTE HOOK: Creating item-serial mapping for Sales Order {sales_order.name}")
-            item_serials_map = {}
-            for manufacturing_serial in sales_order.custom_manufactured_serials:
-                item_code = manufacturing_serial.item_code
-                serial_no = manufacturing_serial.serial_no
-                
-                print(f"🗺️ DELIVERY NOTE HOOK: Mapping serial {serial_no} to item {item_code}")
-                
-                if item_code not in item_serials_map:
-                    item_serials_map[item_code] = []
-                item_serials_map[item_code].append(serial_no)
+            if len(selected_serials) < allocation["required"]:
+                frappe.msgprint(
+                    _("Warning: Only {0} serial numbers available for item {1}, but {2} required").format(
+                        len(selected_serials), item_code, allocation["required"]
+                    ),
+                    title=_("Serial Number Warning"),
+                    indicator="orange"
+                )
             
-            item_code = item.item_code
-            print(f"🔍 DELIVERY NOTE HOOK: Looking for manufacturing serials for item {item_code}")
+            # Nothing to write when the line already holds the allocated serials
+            if not selected_serials or selected_serials == current_serials.get(item.name, []):
+                continue
             
-            # Check if this item has manufacturing serials
-            if item_code in item_serials_map:
-                available_serials = item_serials_map[item_code]
-                required_qty = item.qty
-                
-                print(f"✅ DELIVERY NOTE HOOK: Found {len(available_serials)} manufacturing serials for item {item_code}: {available_serials}")
-                print(f"📊 DELIVERY NOTE HOOK: Required quantity: {required_qty}, Available serials: {len(available_serials)}")
-                
-                # Handle multiple quantity
-                if required_qty <= len(available_serials):
-                    # Take the required number of serials
-                    selected_serials = available_serials[:int(required_qty)]
-                    print(f"✅ DELIVERY NOTE HOOK: Sufficient serials available, selecting {len(selected_serials)}: {selected_serials}")
-                    
-                    # Set the serial numbers for this item
-                    if item.serial_and_batch_bundle:
-                        # Update existing bundle
-                        print(f"📦 DELIVERY NOTE HOOK: Updating serial bundle for item {item_code}")
-                        update_serial_bundle(item, selected_serials)
-                    else:
-                        # Create new bundle or use serial_no field
-                        print(f"📝 DELIVERY NOTE HOOK: Setting serial numbers for item {item_code}")
-                        set_item_serials(item, selected_serials)
-                    
-                    frappe.logger().info(f"Set {len(selected_serials)} serials for item {item_code} in Delivery Note {doc.name}")
-                    print(f"🎉 DELIVERY NOTE HOOK: Successfully set {len(selected_serials)} serials for item {item_code}")
-                else:
-                    # Not enough serials available
-                    print(f"⚠️ DELIVERY NOTE HOOK: Insufficient serials - need {required_qty}, have {len(available_serials)}")
-                    frappe.msgprint(
-                        _("Warning: Only {0} serial numbers available for item {1}, but {2} required").format(
-                            len(available_serials), item_code, required_qty
-                        ),
-                        title=_("Serial Number Warning"),
-                        indicator="orange"
-                    )
-                    
-                    # Use all available serials
-                    if available_serials:
-                        print(f"📝 DELIVERY NOTE HOOK: Using all available serials: {available_serials}")
-                        if item.serial_and_batch_bundle:
-                            update_serial_bundle(item, available_serials)
-                        else:
-                            set_item_serials(item, available_serials)
+            if item.serial_and_batch_bundle:
+                update_serial_bundle(item, selected_serials)
             else:
-                print(f"⚠️ DELIVERY NOTE HOOK: No manufacturing serials found for item {item_code}")
+                set_item_serials(item, selected_serials)
+            
+            frappe.logger().info(f"Set {len(selected_serials)} serials for item {item_code} in Delivery Note {doc.name}")
         
     except Exception as e:
-        print(f"❌ DELIVERY NOTE HOOK: Error in delivery_note_on_load: {str(e)}")
         frappe.logger().error(f"Error in delivery_note_on_load: {str(e)}")
         frappe.msgprint(
             _("Warning: Could not populate manufacturing serials: {0}").format(str(e)),
@@ -127,30 +87,14 @@ def delivery_note_on_load(doc, method):
 def update_serial_bundle(item, serial_numbers):
     """
     Update the Serial and Batch Bundle with the provided serial numbers.
+    Rewrites the entries in SQL inside the Delivery Note's transaction; a failed
+    rewrite is rolled back to its savepoint, so the bundle keeps its old entries.
     """
     try:
         if not item.serial_and_batch_bundle:
             return
         
-        bundle_doc = frappe.get_doc("Serial and Batch Bundle", item.serial_and_batch_bundle)
-        
-        # Clear existing entries
-        bundle_doc.entries = []
-        
-        # Add new entries for each serial number
-        for serial_no in serial_numbers:
-            bundle_doc.append("entries", {
-                "serial_no": serial_no,
-                "batch_no": "",
-                "qty": 1,
-                "incoming_rate": item.rate or 0
-            })
-        
-        # Update total qty
-        bundle_doc.total_qty = len(serial_numbers)
-        
-        bundle_doc.save()
-        frappe.db.commit()
+        rewrite_bundle_entries(item.serial_and_batch_bundle, serial_numbers)
         
     except Exception as e:
         frappe.logger().error(f"Error updating serial bundle: {str(e)}")
@@ -169,6 +113,8 @@ def set_item_serials(item, serial_numbers):
         frappe.logger().error(f"Error setting item serials: {str(e)}")
 
 
+@instrumented()
+@tracing.traced()
 def delivery_note_validate(doc, method):
     """
     Validate that serial numbers are properly set for items with manufacturing serials.
@@ -184,37 +130,23 @@ def delivery_note_validate(doc, method):
         return
     
     try:
+        # Shared with before_save, so the Sales Orders are not loaded again
+        serial_index = get_delivery_note_serial_index(doc)
+        # Serials of every line, all bundles read in one query
+        serials_by_item = get_delivery_note_serials(doc)
+        
         # Validate each item
         for item in doc.items:
             if not item.against_sales_order:
                 continue
-                
-            # Get the Sales Order for this item
-            sales_order = frappe.get_doc("Sales Order", item.against_sales_order)
-            
-            # Check if Sales Order has manufacturing serials
-            if not hasattr(sales_order, 'custom_manufactured_serials') or not sales_order.custom_manufactured_serials:
-                continue
-            
-            # Create a mapping of item_code to available serial numbers
-            item_serials_map = {}
-            for manufacturing_serial in sales_order.custom_manufactured_serials:
-                item_code = manufacturing_serial.item_code
-                serial_no = manufacturing_serial.serial_no
-                
-                if item_code not in item_serials_map:
-                    item_serials_map[item_code] = []
-                item_serials_map[item_code].append(serial_no)
             
+            item_serials_map = serial_index.get(item.against_sales_order) or {}
             item_code = item.item_code
             
             if item_code in item_serials_map:
                 # This item should have manufacturing serials
-                available_serials = item_serials_map[item_code]
                 required_qty = item.qty
-                
-                # Get serial numbers from the item
-                item_serials = get_item_serial_numbers(item)
+                item_serials = serials_by_item.get(item.name, [])
                 
                 if not item_serials:
                     frappe.msgprint(
@@ -235,144 +167,90 @@ def delivery_note_validate(doc, method):
         frappe.logger().error(f"Error in delivery_note_validate: {str(e)}")
 
 
-def get_item_serial_numbers(item):
+def get_allocation_line(item, key=None, serial_nos=None):
     """
-    Extract serial numbers from a Delivery Note item.
+    Describe a Delivery Note line (document row or dict from the client) for allocate_serials
+
+    Args:
+        item: Delivery Note Item row or dict
+        key: allocation key, the row name by default
+        serial_nos (list): serials currently on the line; parsed from its serial_no
+            text when not given, which misses the entries of a bundle
     """
-    serial_numbers = []
-    
-    # Check if using new serial and batch bundle
-    if item.serial_and_batch_bundle:
-        try:
-            bundle_doc = frappe.get_doc("Serial and Batch Bundle", item.serial_and_batch_bundle)
-            for entry in bundle_doc.entries:
-                if entry.serial_no:
-                    serial_numbers.append(entry.serial_no)
-        except Exception as e:
-            frappe.logger().error(f"Error reading serial bundle: {str(e)}")
-    
-    # Check old serial_no field
-    elif item.serial_no:
-        # Split by newlines and commas, clean up
-        serials = item.serial_no.replace('\n', ',').split(',')
-        for serial in serials:
-            serial = serial.strip()
-            if serial:
-                serial_numbers.append(serial)
-    
-    return serial_numbers
+    if serial_nos is None:
+        serial_no = item.get("serial_no") or ""
+        serial_nos = [s.strip() for s in serial_no.replace('\n', ',').split(',') if s.strip()]
+    return {
+        "key": item.get("name") if key is None else key,
+        "against_sales_order": item.get("against_sales_order"),
+        "item_code": item.get("item_code"),
+        "qty": item.get("qty") or 0,
+        "serial_nos": serial_nos
+    }
 
 
 @frappe.whitelist()
 def populate_manufacturing_serials(delivery_note, items):
     """
     Server method to populate manufacturing serials for Delivery Note items.
-    Called from JavaScript.
+    Called from JavaScript with the Sales Order lines of the form as
+    {idx, against_sales_order, item_code, qty, serial_no}; returns only the rows
+    whose serial numbers changed, as {idx, serial_no}.
     """
-    print(f"🔧 DELIVERY NOTE SERVER: populate_manufacturing_serials called for {delivery_note}")
-    print(f"📦 DELIVERY NOTE SERVER: Processing {len(items)} items")
+    if isinstance(items, str):
+        items = json.loads(items)
+    
+    if len(items) > MAX_POPULATE_ITEMS:
+        frappe.throw(_("Cannot populate serials for more than {0} items in one request").format(MAX_POPULATE_ITEMS))
     
     try:
-        result_items = []
+        with tracing.span("populate_manufacturing_serials", delivery_note) as span:
+            changes = _get_serial_changes(delivery_note, items)
+            if span is not None:
+                span["items"] = len(items)
+                span["changes"] = len(changes)
         
-        for i, item_data in enumerate(items):
-            print(f"📦 DELIVERY NOTE SERVER: Processing item {i+1}: {item_data.get('item_code', 'Unknown')}")
-            
-            if not item_data.get('against_sales_order'):
-                print(f"⏭️ DELIVERY NOTE SERVER: Item {i+1} has no sales order reference, skipping")
-                result_items.append({
-                    'serial_no': item_data.get('serial_no', ''),
-                    'serial_and_batch_bundle': item_data.get('serial_and_batch_bundle', '')
-                })
-                continue
-            
-            # Get the Sales Order
-            sales_order_name = item_data['against_sales_order']
-            print(f"📋 DELIVERY NOTE SERVER: Getting Sales Order {sales_order_name}")
-            sales_order = frappe.get_doc("Sales Order", sales_order_name)
-            print(f"📋 DELIVERY NOTE SERVER: Sales Order {sales_order.name} found, Customer: {sales_order.customer}")
-            
-            # Check if Sales Order has manufacturing serials
-            if not hasattr(sales_order, 'custom_manufactured_serials') or not sales_order.custom_manufactured_serials:
-                print(f"⚠️ DELIVERY NOTE SERVER: Sales Order {sales_order.name} has no manufacturing serials")
-                result_items.append({
-                    'serial_no': item_data.get('serial_no', ''),
-                    'serial_and_batch_bundle': item_data.get('serial_and_batch_bundle', '')
-                })
-                continue
-            
-            print(f"✅ DELIVERY NOTE SERVER: Sales Order {sales_order.name} has {len(sales_order.custom_manufactured_serials)} manufacturing serials")
-            
-            # Create a mapping of item_code to serial numbers
-            print(f"🗺️ DELIVERY NOTE SERVER: Creating item-serial mapping for Sales Order {sales_order.name}")
-            item_serials_map = {}
-            for manufacturing_serial in sales_order.custom_manufactured_serials:
-                item_code = manufacturing_serial.item_code
-                serial_no = manufacturing_serial.serial_no
-                
-                print(f"🗺️ DELIVERY NOTE SERVER: Mapping serial {serial_no} to item {item_code}")
-                
-                if item_code not in item_serials_map:
-                    item_serials_map[item_code] = []
-                item_serials_map[item_code].append(serial_no)
-            
-            item_code = item_data['item_code']
-            print(f"🔍 DELIVERY NOTE SERVER: Looking for manufacturing serials for item {item_code}")
-            
-            # Check if this item has manufacturing serials
-            if item_code in item_serials_map:
-                available_serials = item_serials_map[item_code]
-                required_qty = item_data.get('qty', 1)
-                
-                print(f"✅ DELIVERY NOTE SERVER: Found {len(available_serials)} manufacturing serials for item {item_code}: {available_serials}")
-                print(f"📊 DELIVERY NOTE SERVER: Required quantity: {required_qty}, Available serials: {len(available_serials)}")
-                
-                # Handle multiple quantity
-                if required_qty <= len(available_serials):
-                    # Take the required number of serials
-                    selected_serials = available_serials[:int(required_qty)]
-                    print(f"✅ DELIVERY NOTE SERVER: Sufficient serials available, selecting {len(selected_serials)}: {selected_serials}")
-                    
-                    # Set the serial numbers for this item
-                    serial_no_string = '\n'.join(selected_serials)
-                    
-                    result_items.append({
-                        'serial_no': serial_no_string,
-                        'serial_and_batch_bundle': item_data.get('serial_and_batch_bundle', '')
-                    })
-                else:
-                    # Not enough serials available - use all available
-                    print(f"⚠️ DELIVERY NOTE SERVER: Insufficient serials - need {required_qty}, have {len(available_serials)}")
-                    if available_serials:
-                        serial_no_string = '\n'.join(available_serials)
-                        print(f"📝 DELIVERY NOTE SERVER: Using all available serials: {available_serials}")
-                        result_items.append({
-                            'serial_no': serial_no_string,
-                            'serial_and_batch_bundle': item_data.get('serial_and_batch_bundle', '')
-                        })
-                    else:
-                        print(f"⚠️ DELIVERY NOTE SERVER: No serials available for item {item_code}")
-                        result_items.append({
-                            'serial_no': item_data.get('serial_no', ''),
-                            'serial_and_batch_bundle': item_data.get('serial_and_batch_bundle', '')
-                        })
-            else:
-                print(f"⚠️ DELIVERY NOTE SERVER: No manufacturing serials found for item {item_code}")
-                result_items.append({
-                    'serial_no': item_data.get('serial_no', ''),
-                    'serial_and_batch_bundle': item_data.get('serial_and_batch_bundle', '')
-                })
-        
-        print(f"🎉 DELIVERY NOTE SERVER: Successfully processed {len(items)} items, returning {len(result_items)} results")
         return {
             'success': True,
-            'items': result_items
+            'changes': changes
         }
         
     except Exception as e:
-        print(f"❌ DELIVERY NOTE SERVER: Error in populate_manufacturing_serials: {str(e)}")
         frappe.logger().error(f"Error in populate_manufacturing_serials: {str(e)}")
         return {
             'success': False,
             'error': str(e)
         }
+
+
+def _get_serial_changes(delivery_note, items):
+    """Allocate serials for client lines and return {idx, serial_no} for the rows that change"""
+    # Serials of the distinct Sales Orders and items are loaded in one query
+    allocations = allocate_serials(
+        [get_allocation_line(item_data, key=item_data.get('idx')) for item_data in items],
+        delivery_note=delivery_note
+    )
+    
+    changes = []
+    for item_data in items:
+        allocation = allocations.get(item_data.get('idx'))
+        if not allocation:
+            continue
+        
+        if len(allocation["serial_nos"]) < allocation["required"]:
+            frappe.msgprint(
+                _("Warning: Only {0} serial numbers available for item {1}, but {2} required").format(
+                    len(allocation["serial_nos"]), item_data.get('item_code'), allocation["required"]
+                ),
+                title=_("Serial Number Warning"),
+                indicator="orange"
+            )
+        
+        if not allocation["serial_nos"]:
+            continue
+        
+        serial_no = '\n'.join(allocation["serial_nos"])
+        if serial_no != (item_data.get('serial_no') or ''):
+            changes.append({'idx': item_data.get('idx'), 'serial_no': serial_no})
+    
+    return changes
@@ -4,12 +4,14 @@
 import frappe
 from frappe import _
 from frappe.model.document import Document
+from qonevo.hook_metrics import instrumented
 from qonevo.doctype.ctc_salary_structure_template.ctc_salary_structure_template import (
 	create_salary_structure_from_ctc,
 	get_matching_template
 )
 
 
+@instrumented()
 def validate_ctc_salary_structure(doc, method):
 	"""Validate and handle CTC-based salary structure assignment"""
 	if not doc.ctc or not doc.company or not doc.salary_currency:
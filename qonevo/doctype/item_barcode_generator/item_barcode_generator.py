@@ -4,6 +4,8 @@
 import frappe
 from frappe.model.document import Document
 from qonevo.barcode_utils import BarcodeUtils
+from qonevo.item_cache import get_item_attributes
+from qonevo.qonevo.doctype.barcode_registry.barcode_registry import register_barcodes
 
 
 class ItemBarcodeGenerator(Document):
@@ -13,11 +15,13 @@ class ItemBarcodeGenerator(Document):
             frappe.throw("Item Code is required")
         
         # Get item details
-        item_doc = frappe.get_doc("Item", self.item_code)
+        item = get_item_attributes(self.item_code)
+        if not item:
+            frappe.throw(f"Item {self.item_code} not found")
         
         # Set model number from item if not provided
         if not self.model_number:
-            self.model_number = item_doc.get("default_manufacturer_part_no") or ""
+            self.model_number = item.get("default_manufacturer_part_no") or ""
         
         # Set title
         if not self.title:
@@ -30,7 +34,7 @@ class ItemBarcodeGenerator(Document):
         self._generate_barcode()
         
         # Populate item details
-        self._populate_item_details(item_doc)
+        self._populate_item_details(item)
     
     def _generate_barcode(self):
         """Generate barcode string and image"""
@@ -51,19 +55,31 @@ class ItemBarcodeGenerator(Document):
         except Exception as e:
             frappe.throw(f"Error generating barcode: {str(e)}")
     
-    def _populate_item_details(self, item_doc):
-        """Populate item details from item document"""
-        self.item_name = item_doc.item_name
-        self.item_group = item_doc.item_group
-        self.stock_uom = item_doc.stock_uom
-        self.description = item_doc.description
-        self.brand = item_doc.brand
-        self.standard_rate = item_doc.standard_rate
+    def _populate_item_details(self, item):
+        """Populate item details from cached item attributes"""
+        self.item_name = item.item_name
+        self.item_group = item.item_group
+        self.stock_uom = item.stock_uom
+        self.description = item.description
+        self.brand = item.brand
+        self.standard_rate = item.get("standard_rate")
     
     def on_update(self):
         """Called after document is updated"""
         # Update item's barcode if this is the primary barcode
         self._update_item_barcode()
+        self._register_barcode()
+    
+    def _register_barcode(self):
+        """Register the generated barcode string for indexed scan lookups"""
+        serial_no = self.serial_number if self.serial_number and frappe.db.exists("Serial No", self.serial_number) else None
+        register_barcodes([{
+            "barcode": self.barcode_string,
+            "item_code": self.item_code,
+            "serial_no": serial_no,
+            "uom": self.stock_uom,
+            "source": "Serial Barcode" if serial_no else "Custom"
+        }])
     
     def _update_item_barcode(self):
         """Update item's barcode in Item Barcode child table"""
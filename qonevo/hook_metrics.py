@@ -0,0 +1,172 @@
+# Copyright (c) 2026, Qonevo and contributors
+# For license information, please see license.txt
+
+"""
+Cost metrics for qonevo doc_events handlers.
+
+Every handler registered in ``hooks.py`` is wrapped with ``@instrumented()``,
+which records the wall time, SQL query count and rows touched of each call.
+Calls are aggregated per request and flushed to Redis when the transaction
+commits or rolls back, into one hash per hour::
+
+    qonevo:hook_metrics:<YYYYMMDDHH>  ->  <hook>|calls, <hook>|ms, <hook>|queries,
+                                          <hook>|rows, <hook>|errors, <hook>|le_<ms>
+
+Hourly hashes expire after ``RETENTION_HOURS``. ``get_hook_metrics`` rolls up
+the last hours into per-hook averages and latency percentiles.
+"""
+
+import time
+from datetime import timedelta
+from functools import wraps
+
+import frappe
+from frappe.utils import cint, now_datetime
+
+from qonevo.tracing import count_queries
+
+KEY_PREFIX = "qonevo:hook_metrics"
+RETENTION_HOURS = 48
+# Upper bounds (ms) of the latency histogram buckets; slower calls go in "inf"
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def instrumented(hook=None):
+    """Decorator recording wall time, queries and rows of a doc_events handler"""
+    def decorator(fn):
+        name = hook or f"{fn.__module__}.{fn.__name__}"
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            failed = False
+            start = time.perf_counter()
+            with count_queries() as stats:
+                try:
+                    return fn(*args, **kwargs)
+                except Exception:
+                    failed = True
+                    raise
+                finally:
+                    _record(name, (time.perf_counter() - start) * 1000, stats, failed)
+
+        return wrapper
+    return decorator
+
+
+def _record(hook, elapsed_ms, stats, failed):
+    pending = getattr(frappe.local, "qonevo_hook_metrics", None)
+    if pending is None:
+        pending = frappe.local.qonevo_hook_metrics = {}
+        frappe.db.after_commit.add(_flush)
+        frappe.db.after_rollback.add(_flush)
+
+    bucket = next((f"le_{bound}" for bound in BUCKETS_MS if elapsed_ms <= bound), "le_inf")
+    metrics = pending.setdefault(hook, {})
+    for field, value in (
+        ("calls", 1),
+        ("ms", int(round(elapsed_ms))),
+        ("queries", stats.queries),
+        ("rows", stats.rows),
+        ("errors", 1 if failed else 0),
+        (bucket, 1),
+    ):
+        metrics[field] = metrics.get(field, 0) + value
+
+
+def _flush():
+    # Failed submits are flushed too; their cost is what we want to see
+    pending = getattr(frappe.local, "qonevo_hook_metrics", None) or {}
+    frappe.local.qonevo_hook_metrics = None
+    if not pending:
+        return
+
+    cache = frappe.cache()
+    key = cache.make_key(_hour_key(now_datetime()))
+    pipe = cache.pipeline()
+    for hook, metrics in pending.items():
+        for field, value in metrics.items():
+            if value:
+                pipe.hincrby(key, f"{hook}|{field}", value)
+    pipe.expire(key, RETENTION_HOURS * 3600)
+    pipe.execute()
+
+
+def _hour_key(timestamp):
+    return f"{KEY_PREFIX}:{timestamp.strftime('%Y%m%d%H')}"
+
+
+@frappe.whitelist()
+def get_hook_metrics(hours=24):
+    """
+    Per-hook cost over the last hours, slowest total time first
+
+    Args:
+        hours (int): Number of hourly buckets to roll up (at most RETENTION_HOURS)
+
+    Returns:
+        list: dicts with hook, calls, errors, total_ms, avg_ms, p50_ms, p95_ms,
+            avg_queries and avg_rows
+    """
+    frappe.only_for("System Manager")
+
+    hours = min(max(cint(hours), 1), RETENTION_HOURS)
+    current = now_datetime()
+
+    totals = {}
+    for bucket in get_counters([_hour_key(current - timedelta(hours=offset)) for offset in range(hours)]):
+        for field, value in bucket.items():
+            hook, metric = field.rsplit("|", 1)
+            metrics = totals.setdefault(hook, {})
+            metrics[metric] = metrics.get(metric, 0) + value
+
+    result = []
+    for hook, metrics in totals.items():
+        calls = metrics.get("calls", 0)
+        if not calls:
+            continue
+        result.append({
+            "hook": hook,
+            "calls": calls,
+            "errors": metrics.get("errors", 0),
+            "total_ms": metrics.get("ms", 0),
+            "avg_ms": round(metrics.get("ms", 0) / calls, 2),
+            "p50_ms": _percentile(metrics, calls, 0.5),
+            "p95_ms": _percentile(metrics, calls, 0.95),
+            "avg_queries": round(metrics.get("queries", 0) / calls, 2),
+            "avg_rows": round(metrics.get("rows", 0) / calls, 2),
+        })
+
+    return sorted(result, key=lambda row: row["total_ms"], reverse=True)
+
+
+def get_counters(keys):
+    """
+    Read Redis hashes of hincrby counters in one round trip
+
+    Counters are plain Redis integers, so they are read without the pickling
+    wrapper of frappe.cache().
+
+    Args:
+        keys (list): Cache keys, without the site prefix
+
+    Returns:
+        list: one dict (field -> int) per key, empty for missing keys
+    """
+    cache = frappe.cache()
+    pipe = cache.pipeline()
+    for key in keys:
+        pipe.hgetall(cache.make_key(key))
+    return [
+        {frappe.safe_decode(field): int(value) for field, value in bucket.items()}
+        for bucket in pipe.execute()
+    ]
+
+
+def _percentile(metrics, calls, fraction):
+    """Upper bound (ms) of the histogram bucket holding the given fraction of calls"""
+    seen = 0
+    for bound in BUCKETS_MS + ("inf",):
+        seen += metrics.get(f"le_{bound}", 0)
+        if seen >= calls * fraction:
+            return bound
+    return "inf"
@@ -118,15 +118,30 @@ after_install = "qonevo.install.after_install"
 # ---------------
 # Hook on document methods and events
 
+# Every handler below is wrapped with qonevo.hook_metrics.instrumented;
+# per-hook cost is available from qonevo.hook_metrics.get_hook_metrics
 doc_events = {
 	"Employee": {
 		"validate": "qonevo.doctype.employee.employee.validate_ctc_salary_structure"
 	},
+	"Item": {
+		"on_update": [
+			"qonevo.item_cache.on_item_update",
+			"qonevo.qonevo.doctype.barcode_registry.barcode_registry.sync_item_barcodes"
+		],
+		"on_trash": [
+			"qonevo.item_cache.on_item_update",
+			"qonevo.qonevo.doctype.barcode_registry.barcode_registry.remove_item_barcodes"
+		]
+	},
 	"Serial No": {
-		"after_insert": "qonevo.serial_no_after_insert.after_insert",
-		"on_update": "qonevo.serial_number_handlers.on_update",
-		"after_update": "qonevo.serial_number_handlers.after_update",
-		"before_save": "qonevo.serial_number_handlers.before_save"
+		"validate": "qonevo.serial_no_pipeline.validate",
+		"before_save": "qonevo.serial_no_pipeline.before_save",
+		"on_update": "qonevo.serial_no_pipeline.on_update",
+		"on_trash": "qonevo.qonevo.doctype.barcode_registry.barcode_registry.remove_serial_barcodes"
+	},
+	"Item Barcode Generator": {
+		"on_trash": "qonevo.qonevo.doctype.barcode_registry.barcode_registry.remove_generator_barcode"
 	},
 	"Serial and Batch Bundle": {
 		"after_insert": "qonevo.stock_entry_hooks.serial_bundle_after_insert"
@@ -145,6 +160,12 @@ doc_events = {
 # Scheduled Tasks
 # ---------------
 
+scheduler_events = {
+	"daily": [
+		"qonevo.warranty_engine.expire_warranties"
+	]
+}
+
 # scheduler_events = {
 #	"all": [
 #		"qonevo.tasks.all"
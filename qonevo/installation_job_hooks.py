@@ -3,87 +3,75 @@
 
 import frappe
 from frappe import _
+from frappe.utils import flt, now
 
+from qonevo import tracing
+from qonevo.audit import add_audit_comments
+from qonevo.hook_metrics import instrumented
+from qonevo.qonevo.doctype.warranty_record.warranty_record import clear_warranty_coverage_cache
+from qonevo.serial_allocation import get_delivery_note_serials
 
+# Deliveries with more serials than this get their Installation Job in a background job
+INSTALLATION_JOB_DEFER_THRESHOLD = 500
+INSTALLATION_JOB_ITEM_FIELDS = (
+    "name", "parent", "parenttype", "parentfield", "idx",
+    "item", "qty", "serial_no", "installed", "installation_status",
+    "creation", "modified", "owner", "modified_by", "docstatus",
+)
+
+
+@instrumented()
+@tracing.traced()
 def delivery_note_on_submit(doc, method):
     """
     Create Installation Job when Delivery Note is submitted and Sales Order has Installation Required = Yes.
+    Large deliveries (or every delivery, with qonevo_defer_installation_jobs in site config)
+    get their job created by a background job after the submit commits.
     """
-    print(f"🔧 INSTALLATION JOB HOOK: delivery_note_on_submit triggered for {doc.name}")
-    
     try:
         # Check if this Delivery Note has items with serial numbers
-        has_serial_items = False
-        serial_items = []
-        
-        for item in doc.items:
-            if item.serial_no or item.serial_and_batch_bundle:
-                has_serial_items = True
-                serial_items.append(item)
-                print(f"📦 INSTALLATION JOB HOOK: Found serial item {item.item_code} with serial {item.serial_no}")
-        
-        if not has_serial_items:
-            print(f"⏭️ INSTALLATION JOB HOOK: No serial items found in Delivery Note {doc.name}, skipping")
+        if not any(item.serial_no or item.serial_and_batch_bundle for item in doc.items):
+            tracing.debug("No serial items found in Delivery Note %s, skipping", doc.name)
             return
         
-        # Get Sales Order from the first item
-        sales_order_name = None
-        for item in doc.items:
-            if item.against_sales_order:
-                sales_order_name = item.against_sales_order
-                break
-        
-        if not sales_order_name:
-            print(f"⚠️ INSTALLATION JOB HOOK: No Sales Order found in Delivery Note {doc.name}, skipping")
+        if not any(item.against_sales_order for item in doc.items):
+            tracing.debug("No Sales Order found in Delivery Note %s, skipping", doc.name)
             return
         
-        # Get Sales Order details
-        sales_order = frappe.get_doc("Sales Order", sales_order_name)
-        
-        print(f"📋 INSTALLATION JOB HOOK: Creating Installation Job for Sales Order {sales_order_name}")
-        
-        # Create Installation Job
-        installation_job = frappe.new_doc("Installation Job")
-        installation_job.sales_order = sales_order_name
-        installation_job.delivery_note = doc.name
-        installation_job.customer = sales_order.customer
-        installation_job.status = "Scheduled"
-        
-        # Add installation items from Delivery Note items
-        for item in doc.items:
-            if item.serial_no or item.serial_and_batch_bundle:
-                print(f"➕ INSTALLATION JOB HOOK: Adding installation item {item.item_code}")
-                
-                # Extract serial numbers from the item
-                serial_numbers = get_item_serial_numbers(item)
-                
-                # Create installation item for each serial number
-                for serial_no in serial_numbers:
-                    installation_item = installation_job.append("installed_items")
-                    installation_item.item = item.item_code
-                    installation_item.qty = 1  # Each serial number represents 1 item
-                    installation_item.serial_no = serial_no
-                    installation_item.installed = 0  # Default to not installed
-                    installation_item.installation_status = "Pending"
+        serial_count = sum(
+            len(get_item_serial_numbers(item)) for item in doc.items if not item.serial_and_batch_bundle
+        ) + sum(flt(item.qty) for item in doc.items if item.serial_and_batch_bundle)
         
-        # Save the Installation Job
-        installation_job.insert(ignore_permissions=True)
-        frappe.db.commit()
+        if frappe.conf.get("qonevo_defer_installation_jobs") or serial_count > INSTALLATION_JOB_DEFER_THRESHOLD:
+            frappe.enqueue(
+                "qonevo.installation_job_hooks.create_installation_job_for_delivery_note",
+                queue="long",
+                job_id=f"qonevo_installation_job::{doc.name}",
+                deduplicate=True,
+                enqueue_after_commit=True,
+                delivery_note=doc.name
+            )
+            frappe.msgprint(
+                _("Installation Job for {0} will be created in the background").format(doc.name),
+                title=_("Installation Job Queued"),
+                indicator="blue"
+            )
+            return
         
-        print(f"✅ INSTALLATION JOB HOOK: Successfully created Installation Job {installation_job.name}")
-        print(f"🎉 INSTALLATION JOB HOOK: Installation Job created with {len(installation_job.installed_items)} items")
+        installation_job, item_count = create_installation_job(doc)
+        if not installation_job:
+            return
         
         # Show success message to user
         frappe.msgprint(
             _("Installation Job {0} created successfully with {1} items").format(
-                installation_job.name, len(installation_job.installed_items)
+                installation_job, item_count
             ),
             title=_("Installation Job Created"),
             indicator="green"
         )
         
     except Exception as e:
-        print(f"❌ INSTALLATION JOB HOOK: Error creating Installation Job: {str(e)}")
         frappe.logger().error(f"Error creating Installation Job for Delivery Note {doc.name}: {str(e)}")
         
         # Show error message to user
@@ -94,41 +82,150 @@ def delivery_note_on_submit(doc, method):
         )
 
 
-def delivery_note_on_cancel(doc, method):
+def create_installation_job_for_delivery_note(delivery_note):
+    """Background job: create the Installation Job of a submitted Delivery Note"""
+    doc = frappe.get_doc("Delivery Note", delivery_note)
+    if doc.docstatus != 1:
+        return
+    create_installation_job(doc)
+
+
+def create_installation_job(doc):
     """
-    Cancel Installation Job when Delivery Note is cancelled.
+    Create the Installation Job of a Delivery Note with one row per delivered serial
+
+    Idempotent per Delivery Note: an existing job that is not cancelled is returned
+    as is. Serials of all bundle lines are read in one query and the child rows are
+    bulk inserted. The parent and its rows are written under one savepoint, so a
+    failure leaves no job without items behind. Does not commit.
+
+    Returns:
+        tuple: (Installation Job name, number of items), or (None, 0) if there are no serials
     """
-    print(f"🔧 INSTALLATION JOB HOOK: delivery_note_on_cancel triggered for {doc.name}")
+    existing = frappe.db.get_value("Installation Job",
+        {"delivery_note": doc.name, "status": ["!=", "Cancelled"]}, "name")
+    if existing:
+        tracing.debug("Installation Job %s already exists for Delivery Note %s", existing, doc.name)
+        return existing, frappe.db.count("Installation Job Item", {"parent": existing})
+    
+    sales_order_name = next((item.against_sales_order for item in doc.items if item.against_sales_order), None)
+    serials_by_item = get_delivery_note_serials(doc)
+    rows = [
+        (item.item_code, serial_no)
+        for item in doc.items
+        for serial_no in serials_by_item.get(item.name, [])
+    ]
+    if not sales_order_name or not rows:
+        return None, 0
     
+    tracing.debug("Creating Installation Job for Sales Order %s", sales_order_name)
+    
+    frappe.db.savepoint("qonevo_installation_job")
     try:
-        # Find Installation Jobs linked to this Delivery Note
-        installation_jobs = frappe.get_all("Installation Job",
-                                         filters={"delivery_note": doc.name},
-                                         fields=["name", "status"])
+        # The parent is inserted without children; they are bulk inserted below
+        installation_job = frappe.new_doc("Installation Job")
+        installation_job.sales_order = sales_order_name
+        installation_job.delivery_note = doc.name
+        installation_job.customer = doc.customer or frappe.db.get_value("Sales Order", sales_order_name, "customer")
+        installation_job.status = "Scheduled"
+        installation_job.total_items = len(rows)
+        installation_job.installed_count = 0
+        installation_job.not_installed_count = len(rows)
+        installation_job.completion_percentage = 0
+        installation_job.flags.items_bulk_inserted = True
+        installation_job.insert(ignore_permissions=True)
         
-        if not installation_jobs:
-            print(f"ℹ️ INSTALLATION JOB HOOK: No Installation Jobs found for Delivery Note {doc.name}")
-            return
+        timestamp = now()
+        user = frappe.session.user
+        values = [(
+            frappe.generate_hash(length=10), installation_job.name, "Installation Job", "installed_items", idx,
+            item_code, 1, serial_no, 0, "Pending",
+            timestamp, timestamp, user, user, 0,
+        ) for idx, (item_code, serial_no) in enumerate(rows, start=1)]
+        frappe.db.bulk_insert("Installation Job Item", INSTALLATION_JOB_ITEM_FIELDS, values, chunk_size=1000)
+    except Exception:
+        frappe.db.rollback(save_point="qonevo_installation_job")
+        raise
+    
+    tracing.debug("Created Installation Job %s with %s items", installation_job.name, len(rows))
+    return installation_job.name, len(rows)
+
+
+@instrumented()
+@tracing.traced()
+def delivery_note_on_cancel(doc, method):
+    """
+    Cancel Installation Job when Delivery Note is cancelled.
+    Errors are re-raised, so the Delivery Note, its jobs and their warranties
+    are cancelled together or not at all.
+    """
+    try:
+        cancelled = cancel_installation_jobs(doc.name)
+        tracing.debug("Cancelled %s Installation Jobs for Delivery Note %s", len(cancelled), doc.name)
         
-        print(f"📋 INSTALLATION JOB HOOK: Found {len(installation_jobs)} Installation Jobs to cancel")
+    except Exception as e:
+        frappe.logger().error(f"Error cancelling Installation Jobs for Delivery Note {doc.name}: {str(e)}")
+        raise
+
+
+def cancel_installation_jobs(delivery_note):
+    """
+    Cancel the Installation Jobs of a Delivery Note and the Warranty Records created from them
+
+    Runs as set-based updates inside the caller's transaction and adds one audit
+    comment per cancelled job. The updates share one savepoint, so a failure
+    leaves neither jobs nor warranties cancelled. Does not commit.
+
+    Returns:
+        list: names of the Installation Jobs that were cancelled
+    """
+    jobs = frappe.db.sql_list("""
+        SELECT name FROM `tabInstallation Job`
+        WHERE delivery_note = %s AND status != 'Cancelled'
+        FOR UPDATE
+    """, delivery_note)
+    if not jobs:
+        return []
+    
+    timestamp = now()
+    user = frappe.session.user
+    params = {"jobs": tuple(jobs), "timestamp": timestamp, "user": user}
+    
+    frappe.db.savepoint("qonevo_cancel_installation_jobs")
+    try:
+        frappe.db.sql("""
+            UPDATE `tabInstallation Job`
+            SET status = 'Cancelled', modified = %(timestamp)s, modified_by = %(user)s
+            WHERE name IN %(jobs)s
+        """, params)
         
-        for job in installation_jobs:
-            if job.status != "Cancelled":
-                print(f"🗑️ INSTALLATION JOB HOOK: Cancelling Installation Job {job.name}")
-                
-                # Update status to Cancelled
-                frappe.db.set_value("Installation Job", job.name, "status", "Cancelled")
-                frappe.db.commit()
-                
-                print(f"✅ INSTALLATION JOB HOOK: Successfully cancelled Installation Job {job.name}")
-            else:
-                print(f"ℹ️ INSTALLATION JOB HOOK: Installation Job {job.name} already cancelled")
+        warranty_rows = frappe.db.sql("""
+            SELECT installation_job, serial_no FROM `tabWarranty Record`
+            WHERE installation_job IN %(jobs)s AND status != 'Cancelled'
+        """, params)
+        warranties = {}
+        for job, _serial_no in warranty_rows:
+            warranties[job] = warranties.get(job, 0) + 1
         
-        print(f"🎉 INSTALLATION JOB HOOK: Successfully processed {len(installation_jobs)} Installation Jobs")
+        if warranty_rows:
+            frappe.db.sql("""
+                UPDATE `tabWarranty Record`
+                SET status = 'Cancelled', modified = %(timestamp)s, modified_by = %(user)s
+                WHERE installation_job IN %(jobs)s AND status != 'Cancelled'
+            """, params)
         
-    except Exception as e:
-        print(f"❌ INSTALLATION JOB HOOK: Error cancelling Installation Jobs: {str(e)}")
-        frappe.logger().error(f"Error cancelling Installation Jobs for Delivery Note {doc.name}: {str(e)}")
+        add_audit_comments("Installation Job", {
+            job: _("Cancelled with Delivery Note {0}; {1} warranty records cancelled").format(
+                delivery_note, warranties.get(job, 0)
+            )
+            for job in jobs
+        }, timestamp)
+    except Exception:
+        frappe.db.rollback(save_point="qonevo_cancel_installation_jobs")
+        raise
+    
+    clear_warranty_coverage_cache([serial_no for _job, serial_no in warranty_rows])
+    return jobs
 
 
 def get_item_serial_numbers(item):
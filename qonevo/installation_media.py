@@ -0,0 +1,209 @@
+# Copyright (c) 2026, Qonevo and contributors
+# For license information, please see license.txt
+
+"""
+Upload pipeline for Installation Job photos and customer signatures.
+
+Uploads are copied from the request stream to the private files folder in
+chunks, rejected once they pass ``MAX_UPLOAD_BYTES``, and registered as private
+File documents attached to the job without holding the image in memory. A
+background job then writes a bounded thumbnail as its own private File and
+points the job at it:
+
+- photos: ``photo_file`` holds the thumbnail, ``original_file`` the upload
+- signature: ``customer_signature`` holds the thumbnail,
+  ``customer_signature_original`` the upload
+
+Both files are private and attached to the job, so the usual file permission
+checks apply. The job form only loads thumbnails; originals are fetched on
+demand through ``get_original_file``.
+"""
+
+import hashlib
+import os
+
+import frappe
+from frappe import _
+from frappe.utils import get_files_path, now, now_datetime, today
+from PIL import Image, ImageOps
+
+MAX_UPLOAD_BYTES = 15 * 1024 * 1024
+UPLOAD_CHUNK_BYTES = 256 * 1024
+THUMBNAIL_SIZE = 480
+# Extension -> Pillow format of the thumbnail
+IMAGE_FORMATS = {".jpg": "JPEG", ".jpeg": "JPEG", ".png": "PNG", ".webp": "WEBP"}
+
+
+@frappe.whitelist(methods=["POST"])
+def upload_installation_photo(installation_job, photo_type="Installation", description=None, taken_date=None):
+    """
+    Attach a photo (multipart field "file") to an Installation Job
+
+    Returns:
+        dict: photo row name and the original file URL; the thumbnail follows shortly
+    """
+    job = frappe.get_doc("Installation Job", installation_job)
+    job.check_permission("write")
+    file_doc = _save_upload(installation_job)
+
+    # Shown until the thumbnail is ready
+    photo = job.append("photos", {
+        "photo_name": file_doc.file_name,
+        "photo_type": photo_type,
+        "description": description,
+        "taken_date": taken_date or today(),
+        "photo_file": file_doc.file_url,
+        "original_file": file_doc.file_url,
+    })
+    job.save()
+
+    _enqueue_thumbnail(file_doc.name, "Installation Job Photo", photo.name, "photo_file")
+    return {"photo": photo.name, "original_file": file_doc.file_url}
+
+
+@frappe.whitelist(methods=["POST"])
+def upload_customer_signature(installation_job):
+    """
+    Attach the customer signature (multipart field "file") to an Installation Job
+
+    Returns:
+        dict: the original file URL; the thumbnail follows shortly
+    """
+    job = frappe.get_doc("Installation Job", installation_job)
+    job.check_permission("write")
+    file_doc = _save_upload(installation_job)
+
+    job.customer_signature = file_doc.file_url
+    job.customer_signature_original = file_doc.file_url
+    job.signature_date = now_datetime()
+    job.save()
+
+    _enqueue_thumbnail(file_doc.name, "Installation Job", installation_job, "customer_signature")
+    return {"original_file": file_doc.file_url}
+
+
+@frappe.whitelist()
+def get_original_file(installation_job, photo=None):
+    """URL of the full-resolution photo (or signature, without photo) of a job"""
+    frappe.has_permission("Installation Job", "read", doc=installation_job, throw=True)
+
+    if photo:
+        return frappe.db.get_value("Installation Job Photo",
+            {"name": photo, "parent": installation_job, "parenttype": "Installation Job"}, "original_file")
+    return frappe.db.get_value("Installation Job", installation_job, "customer_signature_original")
+
+
+def make_installation_thumbnail(file_name, doctype, name, fieldname):
+    """Background job: write the thumbnail of an upload as a private File and point the job field at it"""
+    original = frappe.db.get_value("File", file_name,
+        ["file_name", "file_url", "attached_to_name"], as_dict=True)
+    if not original:
+        return
+
+    source_path = get_files_path(os.path.basename(original.file_url), is_private=1)
+    if not os.path.exists(source_path):
+        return
+
+    base, extension = os.path.splitext(original.file_name)
+    thumbnail_name = f"{base}-thumb{extension}"
+    thumbnail_path = get_files_path(thumbnail_name, is_private=1)
+
+    with Image.open(source_path) as image:
+        # Camera images carry their rotation in EXIF
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        image_format = IMAGE_FORMATS.get(extension.lower(), "PNG")
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(thumbnail_path, format=image_format)
+
+    thumbnail = _insert_file(thumbnail_name, thumbnail_path, original.attached_to_name)
+    frappe.db.set_value(doctype, name, fieldname, thumbnail.file_url, update_modified=False)
+    _touch_job(original.attached_to_name)
+
+
+def _save_upload(installation_job):
+    """Copy the uploaded file to the private files folder in bounded chunks and register it"""
+    upload = frappe.request and frappe.request.files.get("file")
+    if not upload:
+        frappe.throw(_("No file uploaded"))
+
+    extension = os.path.splitext(upload.filename or "")[1].lower()
+    if extension not in IMAGE_FORMATS:
+        frappe.throw(_("Only {0} images can be uploaded").format(", ".join(IMAGE_FORMATS)))
+
+    if frappe.request.content_length and frappe.request.content_length > MAX_UPLOAD_BYTES + UPLOAD_CHUNK_BYTES:
+        _throw_too_large()
+
+    file_name = f"{installation_job}-{frappe.generate_hash(length=8)}{extension}"
+    path = get_files_path(file_name, is_private=1)
+    # The file is removed again if the upload is rejected or the transaction rolls back
+    frappe.db.after_rollback.add(lambda: _remove_file(path))
+
+    content_hash = hashlib.md5()
+    size = 0
+    with open(path, "wb") as f:
+        while True:
+            chunk = upload.stream.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > MAX_UPLOAD_BYTES:
+                f.close()
+                _remove_file(path)
+                _throw_too_large()
+            content_hash.update(chunk)
+            f.write(chunk)
+
+    return _insert_file(file_name, path, installation_job, content_hash.hexdigest(), size)
+
+
+def _insert_file(file_name, path, installation_job, content_hash=None, size=None):
+    """Register a file already written to the private files folder"""
+    if content_hash is None:
+        content_hash = hashlib.md5()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(UPLOAD_CHUNK_BYTES), b""):
+                content_hash.update(chunk)
+        content_hash = content_hash.hexdigest()
+
+    file_doc = frappe.get_doc({
+        "doctype": "File",
+        "file_name": file_name,
+        "file_url": f"/private/files/{file_name}",
+        "file_size": size if size is not None else os.path.getsize(path),
+        "content_hash": content_hash,
+        "attached_to_doctype": "Installation Job",
+        "attached_to_name": installation_job,
+        "is_private": 1,
+    })
+    file_doc.insert(ignore_permissions=True)
+    return file_doc
+
+
+def _remove_file(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _throw_too_large():
+    frappe.throw(_("File is larger than {0} MB").format(MAX_UPLOAD_BYTES // (1024 * 1024)))
+
+
+def _enqueue_thumbnail(file_name, doctype, name, fieldname):
+    frappe.enqueue(
+        "qonevo.installation_media.make_installation_thumbnail",
+        queue="short",
+        enqueue_after_commit=True,
+        file_name=file_name,
+        doctype=doctype,
+        name=name,
+        fieldname=fieldname
+    )
+
+
+def _touch_job(installation_job):
+    """Bump modified so installer delta sync picks up the thumbnail"""
+    frappe.db.sql("""
+        UPDATE `tabInstallation Job` SET modified = %s, modified_by = %s WHERE name = %s
+    """, (now(), frappe.session.user, installation_job))
@@ -0,0 +1,395 @@
+# Copyright (c) 2026, Qonevo and contributors
+# For license information, please see license.txt
+
+"""
+Installer work-queue API for field devices.
+
+``get_installer_queue`` returns an installer's open Installation Jobs ordered by
+installation date, a page at a time, and ``get_installer_changes`` returns the
+jobs changed since the device last synced. Both use the (assigned_installer,
+status, installation_date) and (assigned_installer, modified) indexes and send
+a compact payload: job header fields and item rows, never photos or signatures.
+
+Pages are keyset paginated; pass back the returned ``cursor`` to get the next
+page. Cursors are opaque strings.
+
+Delta sync re-reads a short overlap window before ``since`` so rows committed
+late by long transactions are not missed; devices must treat jobs as upserts.
+Jobs the device holds that are no longer assigned to the installer are
+returned as ``removed``.
+
+``sync_installation_jobs`` replays a device's queued offline changes in one
+request. Each operation carries an idempotency key and the ``modified`` value
+the device last saw; it runs in its own savepoint and gets its own result.
+"""
+
+import json
+
+import frappe
+from frappe import _
+from frappe.utils import add_to_date, cint, get_datetime, getdate, now, today
+from qonevo.warranty_engine import create_job_warranties
+
+OPEN_STATUSES = ("Scheduled", "In Progress", "Completed - Partial")
+JOB_FIELDS = (
+    "name", "status", "customer", "sales_order", "delivery_note", "installation_date",
+    "total_items", "installed_count", "completion_percentage", "installer_notes", "modified",
+)
+ITEM_FIELDS = ("name", "parent", "idx", "item", "serial_no", "installed", "installation_status", "not_installed_reason")
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Cursor key of jobs without an installation date; they sort after every dated job
+UNDATED = "undated"
+# Seconds re-read before since, covering transactions that commit after the previous sync
+CHANGES_OVERLAP_SECONDS = 300
+MAX_KNOWN_JOBS = 1000
+
+MAX_SYNC_OPERATIONS = 100
+SYNC_KEY_PREFIX = "qonevo:installer_sync"
+SYNC_RESULT_TTL = 7 * 24 * 60 * 60
+SYNC_PENDING_TTL = 5 * 60
+SYNC_ITEM_FIELDS = ("installed", "installation_status", "not_installed_reason", "installer_notes")
+SYNC_ACTIONS = ("start", "complete", "verify", "close")
+
+
+@frappe.whitelist()
+def get_installer_queue(installer=None, date=None, statuses=None, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Open Installation Jobs of an installer, earliest installation date first
+
+    Args:
+        installer (str): User (default: the current user)
+        date (str): Only jobs scheduled on this date
+        statuses (list): Job statuses (default: OPEN_STATUSES)
+        cursor (str): Cursor returned with the previous page
+        page_size (int): Jobs per page, at most MAX_PAGE_SIZE
+
+    Returns:
+        dict: jobs (with their items), cursor for the next page (None on the last page)
+    """
+    installer = _get_installer(installer)
+    statuses = frappe.parse_json(statuses) if statuses else OPEN_STATUSES
+    page_size = min(max(cint(page_size), 1), MAX_PAGE_SIZE)
+
+    conditions = ["assigned_installer = %(installer)s", "status IN %(statuses)s"]
+    params = {"installer": installer, "statuses": tuple(statuses), "limit": page_size + 1}
+
+    if date:
+        conditions.append("installation_date = %(date)s")
+        params["date"] = getdate(date)
+
+    # Plain range predicates on installation_date so the installer index is used
+    if cursor:
+        cursor_date, params["cursor_name"] = _decode_cursor(cursor)
+        if cursor_date == UNDATED:
+            conditions.append("installation_date IS NULL AND name > %(cursor_name)s")
+        else:
+            params["cursor_date"] = cursor_date
+            conditions.append("""(installation_date > %(cursor_date)s
+                OR (installation_date = %(cursor_date)s AND name > %(cursor_name)s)
+                OR installation_date IS NULL)""")
+
+    jobs = frappe.db.sql(f"""
+        SELECT {", ".join(JOB_FIELDS)}
+        FROM `tabInstallation Job`
+        WHERE {" AND ".join(conditions)}
+        ORDER BY installation_date IS NULL, installation_date, name
+        LIMIT %(limit)s
+    """, params, as_dict=True)
+
+    next_cursor = None
+    if len(jobs) > page_size:
+        jobs = jobs[:page_size]
+        last = jobs[-1]
+        next_cursor = _encode_cursor(last.installation_date or UNDATED, last.name)
+
+    return {
+        "jobs": _attach_items(jobs),
+        "cursor": next_cursor
+    }
+
+
+@frappe.whitelist()
+def get_installer_changes(since, installer=None, cursor=None, page_size=DEFAULT_PAGE_SIZE, known_jobs=None):
+    """
+    Installation Jobs of an installer changed since a timestamp, in any status
+
+    Cancelled and closed jobs are included so the device can drop them. Jobs
+    changed up to CHANGES_OVERLAP_SECONDS before since are sent again.
+
+    Args:
+        since (str): Timestamp of the previous sync (the server_time it returned)
+        installer (str): User (default: the current user)
+        cursor (str): Cursor returned with the previous page of this sync
+        page_size (int): Jobs per page, at most MAX_PAGE_SIZE
+        known_jobs (list): Job names held by the device, at most MAX_KNOWN_JOBS;
+            checked on the first page only
+
+    Returns:
+        dict: jobs (with their items), cursor for the next page (None when done),
+            removed (known jobs no longer assigned to the installer or deleted)
+            and server_time to pass as since on the next sync
+    """
+    installer = _get_installer(installer)
+    page_size = min(max(cint(page_size), 1), MAX_PAGE_SIZE)
+    server_time = now()
+
+    conditions = ["assigned_installer = %(installer)s", "modified > %(since)s"]
+    params = {
+        "installer": installer,
+        "since": add_to_date(get_datetime(since), seconds=-CHANGES_OVERLAP_SECONDS),
+        "limit": page_size + 1
+    }
+
+    if cursor:
+        params["cursor_modified"], params["cursor_name"] = _decode_cursor(cursor)
+        conditions.append("""(modified > %(cursor_modified)s
+            OR (modified = %(cursor_modified)s AND name > %(cursor_name)s))""")
+
+    jobs = frappe.db.sql(f"""
+        SELECT {", ".join(JOB_FIELDS)}
+        FROM `tabInstallation Job`
+        WHERE {" AND ".join(conditions)}
+        ORDER BY modified, name
+        LIMIT %(limit)s
+    """, params, as_dict=True)
+
+    next_cursor = None
+    if len(jobs) > page_size:
+        jobs = jobs[:page_size]
+        next_cursor = _encode_cursor(jobs[-1].modified, jobs[-1].name)
+
+    return {
+        "jobs": _attach_items(jobs),
+        "cursor": next_cursor,
+        "removed": [] if cursor else _get_removed_jobs(installer, known_jobs),
+        "server_time": server_time
+    }
+
+
+@frappe.whitelist(methods=["POST"])
+def sync_installation_jobs(operations):
+    """
+    Apply a batch of offline Installation Job changes
+
+    Each operation is a dict with:
+
+    - key: idempotency key chosen by the device; a key already applied returns
+      its stored result instead of applying again
+    - job: Installation Job name
+    - modified: the job's modified timestamp as last seen by the device; if the
+      job changed since, the operation is rejected as a conflict. Changes made
+      by earlier operations of the same batch do not count, so a device can
+      queue several operations on one job against the same base
+    - items (optional): [{name or serial_no, installed, installation_status,
+      not_installed_reason, installer_notes}]
+    - installer_notes, ops_notes, warranty_action (optional)
+    - action (optional): start, complete, verify or close
+
+    Returns:
+        dict: results, one per operation in input order, each with key and a status
+            of ok, conflict, error or in_progress (same key still being applied)
+    """
+    if isinstance(operations, str):
+        operations = json.loads(operations)
+
+    if len(operations) > MAX_SYNC_OPERATIONS:
+        frappe.throw(_("Cannot sync more than {0} operations in one request").format(MAX_SYNC_OPERATIONS))
+
+    pending = {}
+    frappe.db.after_commit.add(lambda: _store_sync_results(pending))
+    frappe.db.after_rollback.add(lambda: _release_sync_keys(pending))
+
+    results = []
+    # job -> (modified before this batch, modified after its last applied operation)
+    applied = {}
+    for operation in operations:
+        key = operation.get("key")
+        if not key:
+            results.append({"key": None, "status": "error", "error": _("Idempotency key is required")})
+            continue
+
+        redis_key = frappe.cache().make_key(f"{SYNC_KEY_PREFIX}:{frappe.session.user}:{key}")
+        if not frappe.cache().set(redis_key, "pending", nx=True, ex=SYNC_PENDING_TTL):
+            stored = frappe.cache().get(redis_key)
+            if stored and stored != b"pending":
+                results.append(dict(json.loads(stored), replayed=True))
+            else:
+                results.append({"key": key, "status": "in_progress"})
+            continue
+
+        savepoint = f"qonevo_sync_{len(results)}"
+        frappe.db.savepoint(savepoint)
+        try:
+            result = _apply_sync_operation(operation, applied)
+        except Exception as e:
+            frappe.db.rollback(save_point=savepoint)
+            frappe.clear_messages()
+            result = {"status": "error", "error": str(e)}
+
+        result["key"] = key
+        results.append(result)
+        # Only applied operations are remembered; conflicts and errors may be retried
+        pending[redis_key] = result if result["status"] == "ok" else None
+
+    return {"results": results}
+
+
+def _apply_sync_operation(operation, applied):
+    doc = frappe.get_doc("Installation Job", operation.get("job"))
+    doc.check_permission("write")
+
+    current = get_datetime(doc.modified)
+    base, batch_modified = applied.get(doc.name, (current, current))
+    seen = operation.get("modified") and get_datetime(operation["modified"])
+    # Accept the device's base when only this batch has changed the job since
+    if not seen or current != batch_modified or seen not in (base, batch_modified):
+        return {
+            "status": "conflict",
+            "job": doc.name,
+            "server_modified": str(doc.modified),
+            "server_status": doc.status
+        }
+
+    rows_by_name = {row.name: row for row in doc.installed_items}
+    rows_by_serial = {row.serial_no: row for row in doc.installed_items if row.serial_no}
+    for change in operation.get("items") or []:
+        row = rows_by_name.get(change.get("name")) or rows_by_serial.get(change.get("serial_no"))
+        if not row:
+            frappe.throw(_("Item {0} is not part of Installation Job {1}").format(
+                change.get("name") or change.get("serial_no"), doc.name))
+        for fieldname in SYNC_ITEM_FIELDS:
+            if fieldname in change:
+                row.set(fieldname, change[fieldname])
+
+    if operation.get("installer_notes") is not None:
+        doc.installer_notes = operation["installer_notes"]
+    if operation.get("ops_notes") is not None:
+        doc.ops_verification_notes = operation["ops_notes"]
+    if operation.get("warranty_action"):
+        doc.warranty_start_action = operation["warranty_action"]
+
+    action = operation.get("action")
+    if action and action not in SYNC_ACTIONS:
+        frappe.throw(_("Unknown action {0}").format(action))
+    _apply_sync_action(doc, action)
+
+    doc.save()
+
+    # Completing in full creates the warranties during save; partial completions
+    # and warranties missed there are created here
+    warranties = doc.flags.warranties_created or 0
+    if action == "complete":
+        warranties += create_job_warranties(doc).created
+
+    # Recorded last: an error above rolls the operation back to its savepoint
+    applied[doc.name] = (base, get_datetime(doc.modified))
+
+    return {
+        "status": "ok",
+        "job": doc.name,
+        "job_status": doc.status,
+        "modified": str(doc.modified),
+        "warranties_created": warranties
+    }
+
+
+def _apply_sync_action(doc, action):
+    """Status transitions with the same rules as the single-job endpoints"""
+    if action == "start":
+        if doc.status != "Scheduled":
+            frappe.throw(_("Only scheduled installation jobs can be started"))
+        doc.status = "In Progress"
+        doc.installation_date = today()
+
+    elif action == "complete":
+        if doc.status not in ["In Progress", "Completed - Full", "Completed - Partial"]:
+            frappe.throw(_("Only installation jobs with items being installed can be completed"))
+        doc._explicitly_completing = True
+        doc.validate_photos_and_signature()
+        if not doc.installation_date:
+            doc.installation_date = today()
+        summary = doc.get_summary()
+        doc.status = "Completed - Full" if summary.installed == summary.total else "Completed - Partial"
+
+    elif action == "verify":
+        if doc.status not in ["Completed - Full", "Completed - Partial"]:
+            frappe.throw(_("Only completed installation jobs can be verified"))
+        doc.status = "Verified"
+
+    elif action == "close":
+        if doc.status != "Verified":
+            frappe.throw(_("Only verified installation jobs can be closed"))
+        doc.status = "Closed"
+
+
+def _store_sync_results(pending):
+    cache = frappe.cache()
+    for redis_key, result in pending.items():
+        if result is None:
+            cache.delete(redis_key)
+        else:
+            cache.set(redis_key, json.dumps(result, default=str), ex=SYNC_RESULT_TTL)
+
+
+def _release_sync_keys(pending):
+    if pending:
+        frappe.cache().delete(*pending)
+
+
+def _get_installer(installer):
+    """The installer whose queue is read; other users' queues need System Manager"""
+    frappe.has_permission("Installation Job", "read", throw=True)
+    installer = installer or frappe.session.user
+    if installer != frappe.session.user:
+        frappe.only_for("System Manager")
+    return installer
+
+
+def _get_removed_jobs(installer, known_jobs):
+    """Known job names that are deleted or no longer assigned to the installer"""
+    known_jobs = frappe.parse_json(known_jobs) if known_jobs else []
+    if not known_jobs:
+        return []
+    if len(known_jobs) > MAX_KNOWN_JOBS:
+        frappe.throw(_("Cannot check more than {0} known jobs at once").format(MAX_KNOWN_JOBS))
+
+    assigned = set(frappe.db.sql_list("""
+        SELECT name FROM `tabInstallation Job`
+        WHERE name IN %s AND assigned_installer = %s
+    """, (tuple(known_jobs), installer)))
+    return [name for name in known_jobs if name not in assigned]
+
+
+def _attach_items(jobs):
+    """Load the item rows of all jobs in one query"""
+    if not jobs:
+        return jobs
+
+    items = frappe.get_all("Installation Job Item",
+        filters={
+            "parenttype": "Installation Job",
+            "parentfield": "installed_items",
+            "parent": ["in", [job.name for job in jobs]]
+        },
+        fields=list(ITEM_FIELDS),
+        order_by="parent asc, idx asc"
+    )
+
+    by_job = {}
+    for item in items:
+        by_job.setdefault(item.pop("parent"), []).append(item)
+    for job in jobs:
+        job["items"] = by_job.get(job.name, [])
+    return jobs
+
+
+def _encode_cursor(key, name):
+    return f"{key}|{name}"
+
+
+def _decode_cursor(cursor):
+    key, separator, name = cursor.partition("|")
+    if not separator:
+        frappe.throw(_("Invalid cursor"))
+    return key, name
@@ -0,0 +1,163 @@
+# Copyright (c) 2026, Qonevo and contributors
+# For license information, please see license.txt
+
+"""
+Item attribute cache for barcode, serial and delivery hooks.
+
+Hot paths only need a handful of Item columns, so instead of loading the full
+Item (with every child table) they read from three layers:
+
+1. a per-request dict on ``frappe.local``
+2. a bounded per-worker LRU whose entries expire after ``WORKER_CACHE_TTL``
+3. one Redis key per item, shared by all workers, expiring after ``REDIS_TTL``
+
+Misses are fetched from ``tabItem`` in a single column-only query. Item
+``on_update``/``on_trash`` drop the entry from Redis and the local layers, and
+drop the Redis entry again after commit, so a concurrent reader that cached
+the pre-commit row does not leave it behind; other workers pick up the change
+once their LRU entry expires.
+"""
+
+import time
+from collections import OrderedDict
+
+import frappe
+
+from qonevo.hook_metrics import instrumented
+from qonevo.request_cache import get_request_cache
+
+ITEM_ATTRIBUTE_FIELDS = (
+    "item_name",
+    "item_group",
+    "stock_uom",
+    "description",
+    "brand",
+    "standard_rate",
+    "is_stock_item",
+    "has_serial_no",
+    "has_batch_no",
+    "default_manufacturer_part_no",
+    "custom_default_model_number",
+    "custom_default_size",
+)
+
+REDIS_KEY = "qonevo:item_attributes"
+REDIS_TTL = 6 * 60 * 60  # seconds
+WORKER_CACHE_SIZE = 2048
+WORKER_CACHE_TTL = 60  # seconds
+
+# (site, item_code) -> (expires_at, attributes); workers serve several sites
+_worker_cache = OrderedDict()
+
+
+def get_item_attribute_fields():
+    """Attribute fields that exist on this site's Item doctype"""
+    meta = frappe.get_meta("Item")
+    return [fieldname for fieldname in ITEM_ATTRIBUTE_FIELDS if meta.has_field(fieldname)]
+
+
+def get_item_attributes(item_code):
+    """
+    Get cached attributes for an item
+
+    Args:
+        item_code (str): Item code
+
+    Returns:
+        frappe._dict: Item attributes, or None if the item does not exist
+    """
+    if not item_code:
+        return None
+    return get_item_attributes_map([item_code]).get(item_code)
+
+
+def get_item_attributes_map(item_codes):
+    """
+    Get cached attributes for many items, fetching all misses in one query
+
+    Args:
+        item_codes (list): Item codes
+
+    Returns:
+        dict: item_code -> frappe._dict of attributes (missing items are omitted)
+    """
+    request_cache = get_request_cache("qonevo_item_attributes")
+    result = {}
+    missing = []
+
+    for item_code in set(filter(None, item_codes)):
+        attributes = request_cache.get(item_code) or _get_from_worker_cache(item_code)
+        if attributes is None:
+            attributes = frappe.cache().get_value(_redis_key(item_code), expires=True)
+            if attributes is not None:
+                _set_worker_cache(item_code, attributes)
+
+        if attributes is None:
+            missing.append(item_code)
+        else:
+            request_cache[item_code] = attributes
+            result[item_code] = attributes
+
+    if missing:
+        rows = frappe.get_all("Item",
+            filters={"name": ["in", missing]},
+            fields=["name"] + get_item_attribute_fields()
+        )
+        for row in rows:
+            attributes = dict(row)
+            attributes["item_code"] = attributes.pop("name")
+            frappe.cache().set_value(_redis_key(row.name), attributes, expires_in_sec=REDIS_TTL)
+            _set_worker_cache(row.name, attributes)
+            request_cache[row.name] = attributes
+            result[row.name] = attributes
+
+    # Hand out copies so callers cannot mutate the cached values
+    return {item_code: frappe._dict(attributes) for item_code, attributes in result.items()}
+
+
+def clear_item_attributes(item_code=None):
+    """Drop one item (or every item) from all cache layers"""
+    request_cache = get_request_cache("qonevo_item_attributes")
+    if item_code:
+        frappe.cache().delete_value(_redis_key(item_code))
+        _worker_cache.pop((frappe.local.site, item_code), None)
+        request_cache.pop(item_code, None)
+    else:
+        frappe.cache().delete_keys(f"{REDIS_KEY}:")
+        for key in [key for key in _worker_cache if key[0] == frappe.local.site]:
+            del _worker_cache[key]
+        request_cache.clear()
+
+
+@instrumented()
+def on_item_update(doc, method):
+    """Item on_update / on_trash: invalidate the cached attributes, now and after commit"""
+    clear_item_attributes(doc.name)
+    frappe.db.after_commit.add(lambda: frappe.cache().delete_value(_redis_key(doc.name)))
+
+
+def _redis_key(item_code):
+    return f"{REDIS_KEY}:{item_code}"
+
+
+def _get_from_worker_cache(item_code):
+    key = (frappe.local.site, item_code)
+    cached = _worker_cache.get(key)
+    if not cached:
+        return None
+
+    expires_at, attributes = cached
+    if expires_at < time.monotonic():
+        _worker_cache.pop(key, None)
+        return None
+
+    _worker_cache.move_to_end(key)
+    return attributes
+
+
+def _set_worker_cache(item_code, attributes):
+    key = (frappe.local.site, item_code)
+    _worker_cache[key] = (time.monotonic() + WORKER_CACHE_TTL, attributes)
+    _worker_cache.move_to_end(key)
+    while len(_worker_cache) > WORKER_CACHE_SIZE:
+        _worker_cache.popitem(last=False)
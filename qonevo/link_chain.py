@@ -0,0 +1,92 @@
+# Copyright (c) 2026, Qonevo and contributors
+# For license information, please see license.txt
+
+"""
+Resolve chains of Link fields with one joined query.
+
+Hooks often walk Stock Entry -> Work Order -> Sales Order only to read a few
+columns, loading every document with all its child tables on the way.
+``get_link_chain`` fetches just the requested columns of each document in the
+chain with one LEFT JOIN query::
+
+    stock_entry, work_order = get_link_chain(
+        "Stock Entry", name, ["purpose", "posting_date"],
+        ("work_order", "Work Order", ["sales_order"]),
+    )
+
+Resolved chains are memoized on ``frappe.local`` for the rest of the request; call
+``clear_link_chain_cache`` after changing a document whose values were read.
+"""
+
+import frappe
+
+from qonevo.request_cache import get_request_cache
+
+
+def get_link_chain(doctype, name, fields, *hops):
+    """
+    Columns of a document and the documents reached through its Link fields
+
+    Args:
+        doctype (str): DocType of the first document
+        name (str): Name of the first document
+        fields (list): Columns to read from the first document
+        hops: (link_field, doctype, fields) tuples; link_field is a Link field
+            of the previous document in the chain and is read automatically
+
+    Returns:
+        list: one frappe._dict (with name and the requested fields) per document,
+            None where the document or the link to it does not exist. Shared
+            across the request; do not modify.
+    """
+    hop_key = tuple((link, target, tuple(columns)) for link, target, columns in hops)
+    key = (doctype, name, tuple(fields), hop_key)
+    cache = get_request_cache("qonevo_link_chains")
+    if key in cache:
+        return cache[key]
+
+    if not name:
+        return [None] * (len(hops) + 1)
+
+    chain = _fetch_link_chain(doctype, name, fields, hops)
+    # A document not inserted yet may exist later in the same request
+    if chain[0]:
+        cache[key] = chain
+    return chain
+
+
+def clear_link_chain_cache():
+    """Forget every chain resolved in this request"""
+    get_request_cache("qonevo_link_chains").clear()
+
+
+def _fetch_link_chain(doctype, name, fields, hops):
+    # Every document contributes its name, its requested fields and the link to the next one
+    columns = [["name", *fields]]
+    for link, _target, hop_fields in hops:
+        if link not in columns[-1]:
+            columns[-1].append(link)
+        columns.append(["name", *hop_fields])
+
+    select = []
+    for position, document_columns in enumerate(columns):
+        select.extend(f"t{position}.`{column}` AS `t{position}__{column}`" for column in document_columns)
+
+    joins = [f"`tab{doctype}` t0"]
+    for position, (link, target, _fields) in enumerate(hops, start=1):
+        joins.append(f"LEFT JOIN `tab{target}` t{position} ON t{position}.name = t{position - 1}.`{link}`")
+
+    rows = frappe.db.sql(f"""
+        SELECT {", ".join(select)}
+        FROM {" ".join(joins)}
+        WHERE t0.name = %s
+    """, name, as_dict=True)
+
+    if not rows:
+        return [None] * len(columns)
+
+    chain = []
+    for position, document_columns in enumerate(columns):
+        values = frappe._dict({column: rows[0][f"t{position}__{column}"] for column in document_columns})
+        chain.append(values if values.name else None)
+    return chain
@@ -1,20 +1,80 @@
 import frappe
+from frappe import _
+
+from qonevo.db_utils import execute_and_count
+from qonevo.item_cache import get_item_attributes_map
+
+# Serial No field -> Item field holding its default
+ITEM_DEFAULT_FIELDS = {
+    "custom_model_number": "custom_default_model_number",
+    "custom_size": "custom_default_size",
+}
+
 
 def set_model_and_size(doc, method):
     """
     Automatically set model and size on Serial No based on Item defaults.
     Runs on insert/validate.
     """
-    if not doc.item_code:
+    apply_model_and_size_defaults([doc])
+
+
+def apply_model_and_size_defaults(serial_docs):
+    """
+    Fill empty model and size fields on Serial No documents from their Item defaults.
+
+    Only mutates the in-memory documents, so it is safe to call for many serials
+    inside one transaction. Item defaults come from the item attribute cache,
+    fetched once for all distinct items.
+    """
+    serial_docs = [doc for doc in serial_docs if doc.item_code]
+    if not serial_docs:
         return
 
-    item = frappe.get_doc("Item", doc.item_code)
+    items = get_item_attributes_map([doc.item_code for doc in serial_docs])
+
+    for doc in serial_docs:
+        item = items.get(doc.item_code)
+        if not item:
+            continue
+
+        for serial_field, item_field in ITEM_DEFAULT_FIELDS.items():
+            if not doc.get(serial_field) and item.get(item_field):
+                doc.set(serial_field, item.get(item_field))
+
+
+@frappe.whitelist()
+def backfill_model_and_size(item_code=None):
+    """
+    Apply Item model and size defaults to existing Serial Nos that have none.
+
+    Uses one UPDATE ... JOIN per field, optionally limited to a single item.
+    Can be run with `bench --site <site> execute qonevo.overrides.serial_no_handlers.backfill_model_and_size`.
+    """
+    frappe.only_for("System Manager")
+
+    serial_meta = frappe.get_meta("Serial No")
+    item_meta = frappe.get_meta("Item")
+    item_condition = "AND sn.item_code = %(item_code)s" if item_code else ""
 
-    if not doc.custom_model_number and item.custom_default_model_number:
-        doc.custom_model_number = item.custom_default_model_number
-        frappe.db.commit()
+    updated = {}
+    for serial_field, item_field in ITEM_DEFAULT_FIELDS.items():
+        if not (serial_meta.has_field(serial_field) and item_meta.has_field(item_field)):
+            continue
 
-    if not doc.custom_size and item.custom_default_size:
-        doc.custom_size = item.custom_default_size
-        frappe.db.commit()
+        updated[serial_field] = execute_and_count(f"""
+            UPDATE `tabSerial No` sn
+            INNER JOIN `tabItem` i ON i.name = sn.item_code
+            SET sn.`{serial_field}` = i.`{item_field}`
+            WHERE IFNULL(sn.`{serial_field}`, '') = ''
+                AND IFNULL(i.`{item_field}`, '') != ''
+                {item_condition}
+        """, {"item_code": item_code})
 
+    return {
+        "success": True,
+        "updated": updated,
+        "message": _("Updated {0} model numbers and {1} sizes").format(
+            updated.get("custom_model_number", 0), updated.get("custom_size", 0)
+        )
+    }
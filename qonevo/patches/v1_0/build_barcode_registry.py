@@ -0,0 +1,7 @@
+import frappe
+
+def execute():
+	"""Backfill the barcode registry from existing Item Barcodes and Serial Nos"""
+	from qonevo.qonevo.doctype.barcode_registry.barcode_registry import build_barcode_registry
+
+	build_barcode_registry()
@@ -92,29 +92,76 @@ qonevo.custom_barcode_scanner = {
         console.log("Barcode scanner override applied successfully");
     },
     
-    // Process the scanned barcode
+    // Scans waiting to be resolved in one batch request
+    scan_queue: [],
+    scan_timer: null,
+    SCAN_BATCH_DELAY: 150,   // ms to wait for further scans before sending
+    SCAN_BATCH_SIZE: 50,     // send immediately once this many scans are queued (server accepts up to 500)
+    
+    // Process the scanned barcode - scans are queued and resolved in batches
     process_barcode: function(frm, barcode_string, child_table) {
-        console.log("Processing barcode:", barcode_string);
+        let scanner = qonevo.custom_barcode_scanner;
+        scanner.scan_queue.push({
+            frm: frm,
+            child_table: child_table,
+            barcode_string: barcode_string
+        });
+        
+        if (scanner.scan_queue.length >= scanner.SCAN_BATCH_SIZE) {
+            scanner.flush_scan_queue();
+            return;
+        }
+        
+        clearTimeout(scanner.scan_timer);
+        scanner.scan_timer = setTimeout(scanner.flush_scan_queue, scanner.SCAN_BATCH_DELAY);
+    },
+    
+    // Resolve all queued scans with a single API call, applying results in scan order
+    flush_scan_queue: function() {
+        let scanner = qonevo.custom_barcode_scanner;
+        clearTimeout(scanner.scan_timer);
+        
+        let batch = scanner.scan_queue.splice(0, scanner.SCAN_BATCH_SIZE);
+        if (!batch.length) {
+            return;
+        }
+        if (scanner.scan_queue.length) {
+            scanner.scan_timer = setTimeout(scanner.flush_scan_queue, 0);
+        }
         
-        // Call our barcode scanning API
         frappe.call({
-            method: "qonevo.barcode_utils.scan_item_barcode",
+            method: "qonevo.barcode_utils.scan_item_barcodes",
             args: {
-                barcode_string: barcode_string
+                barcode_strings: batch.map(scan => scan.barcode_string)
             },
             callback: function(r) {
-                console.log("API Response:", r);
-                if (r.message && r.message.success) {
-                    console.log("Success! Adding item to table...");
-                    qonevo.custom_barcode_scanner.add_item_to_table(frm, child_table, r.message);
+                let results = r.message || [];
+                let added = 0;
+                let last_item_code = null;
+                let failed = [];
+                
+                batch.forEach((scan, index) => {
+                    let result = results[index];
+                    if (result && result.success) {
+                        scanner.add_item_to_table(scan.frm, scan.child_table, result);
+                        added++;
+                        last_item_code = result.item_code;
+                    } else {
+                        failed.push(scan.barcode_string);
+                    }
+                });
+                
+                if (added) {
                     frappe.show_alert({
-                        message: `Item ${r.message.item_code} added successfully!`,
+                        message: added === 1
+                            ? `Item ${last_item_code} added successfully!`
+                            : `${added} items added successfully!`,
                         indicator: 'green'
                     });
-                } else {
-                    console.log("API failed:", r.message);
+                }
+                if (failed.length) {
                     frappe.show_alert({
-                        message: `Barcode not found: ${barcode_string}`,
+                        message: `Barcode not found: ${failed.join(', ')}`,
                         indicator: 'red'
                     });
                 }
@@ -123,39 +123,46 @@ function populate_manufacturing_serials_simple(frm) {
         console.log(`✅ DELIVERY NOTE JS: Found items with sales order references: ${sales_orders_found.join(', ')}`);
         console.log('📞 DELIVERY NOTE JS: Calling server method...');
         
+        // Only Sales Order lines, and only the fields the server needs
+        let lines = frm.doc.items
+            .filter(item => item.against_sales_order)
+            .map(item => ({
+                idx: item.idx,
+                against_sales_order: item.against_sales_order,
+                item_code: item.item_code,
+                qty: item.qty,
+                serial_no: item.serial_no || ''
+            }));
+
         // Call server method
         frappe.call({
             method: 'qonevo.delivery_note_hooks.populate_manufacturing_serials',
             args: {
                 delivery_note: frm.doc.name || 'new',
-                items: frm.doc.items
+                items: lines
             },
             callback: function(r) {
                 console.log('📞 DELIVERY NOTE JS: Server response received:', r);
 
-                if (r.message && r.message.success && r.message.items) {
-                    console.log('✅ DELIVERY NOTE JS: Server method successful, updating form fields...');
-
-                    // Update each item
-                    r.message.items.forEach((item_data, index) => {
-                        if (frm.doc.items[index] && item_data.serial_no) {
-                            // Direct field update
-                            frm.doc.items[index].serial_no = item_data.serial_no;
-                            console.log(`✅ DELIVERY NOTE JS: Set serial for item ${index + 1}: ${item_data.serial_no}`);
-                        } else if (frm.doc.items[index]) {
-                            console.log(`⚠️ DELIVERY NOTE JS: No serial data for item ${index + 1}`);
+                if (r.message && r.message.success) {
+                    let changes = r.message.changes || [];
+                    console.log(`✅ DELIVERY NOTE JS: Server method successful, ${changes.length} rows changed`);
+
+                    // Apply the changed rows only
+                    changes.forEach(change => {
+                        let row = frm.doc.items.find(item => item.idx === change.idx);
+                        if (row) {
+                            row.serial_no = change.serial_no;
                         }
                     });
 
-                    // Refresh the form
-                    frm.refresh_fields();
-                    console.log('🔄 DELIVERY NOTE JS: Form fields refreshed');
-
-                    // Show success message
-                    frappe.show_alert({
-                        message: 'Manufacturing serials populated successfully!',
-                        indicator: 'green'
-                    });
+                    if (changes.length) {
+                        frm.refresh_field('items');
+                        frappe.show_alert({
+                            message: 'Manufacturing serials populated successfully!',
+                            indicator: 'green'
+                        });
+                    }
 
                     console.log('🎉 DELIVERY NOTE JS: Serial population completed successfully');
                 } else {
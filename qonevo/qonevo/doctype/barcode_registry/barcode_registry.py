@@ -0,0 +1,258 @@
+# Copyright (c) 2026, Qonevo and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe import _
+from frappe.model.document import Document
+from frappe.utils import now
+from qonevo.hook_metrics import instrumented
+
+
+# Item columns returned alongside a registry hit; filtered against the Item
+# meta so sites without the optional manufacturer fields still resolve.
+ITEM_DETAIL_FIELDS = (
+    "item_name",
+    "item_group",
+    "stock_uom",
+    "description",
+    "brand",
+    "standard_rate",
+    "is_stock_item",
+    "has_serial_no",
+    "has_batch_no",
+    "default_manufacturer_part_no",
+)
+
+
+class BarcodeRegistry(Document):
+    def validate(self):
+        """Default the UOM to the item's stock UOM"""
+        if not self.uom and self.item_code:
+            self.uom = frappe.db.get_value("Item", self.item_code, "stock_uom")
+
+
+# Serial entries win collisions: a non-serial source never overwrites them.
+# source is assigned last so every condition still sees the stored source.
+SERIAL_SOURCES = "('Serial No', 'Serial Barcode')"
+_KEEP_SERIAL = f"source IN {SERIAL_SOURCES} AND VALUES(source) NOT IN {SERIAL_SOURCES}"
+ON_DUPLICATE_UPDATE = "ON DUPLICATE KEY UPDATE\n" + ",\n".join(
+    f"{column} = IF({_KEEP_SERIAL}, {column}, VALUES({column}))"
+    for column in ("item_code", "serial_no", "batch_no", "uom", "modified", "modified_by", "source")
+)
+
+
+def get_item_detail_fields():
+    """Item detail fields that exist on this site"""
+    meta = frappe.get_meta("Item")
+    return [fieldname for fieldname in ITEM_DETAIL_FIELDS if meta.has_field(fieldname)]
+
+
+def _item_detail_columns():
+    """Item detail fields as `i`.`field` select expressions"""
+    return ", ".join(f"i.`{fieldname}`" for fieldname in get_item_detail_fields())
+
+
+def resolve_barcodes(barcode_strings):
+    """
+    Resolve many barcode strings against the registry in one indexed query
+
+    Args:
+        barcode_strings (list): Scanned barcode strings
+
+    Returns:
+        dict: barcode string -> row with item_code, serial_no, batch_no, uom and item details
+    """
+    barcode_strings = list({b for b in barcode_strings if b})
+    if not barcode_strings:
+        return {}
+
+    rows = frappe.db.sql(f"""
+        SELECT r.name AS barcode, r.item_code, r.serial_no, r.batch_no, r.source,
+            COALESCE(r.uom, i.stock_uom) AS uom, {_item_detail_columns()}
+        FROM `tabBarcode Registry` r
+        INNER JOIN `tabItem` i ON i.name = r.item_code
+        WHERE r.name IN %(barcodes)s
+    """, {"barcodes": tuple(barcode_strings)}, as_dict=True)
+
+    return {row.barcode: row for row in rows}
+
+
+def resolve_barcode(barcode_string):
+    """Resolve a single barcode string, returns None if it is not registered"""
+    return resolve_barcodes([barcode_string]).get(barcode_string)
+
+
+def register_barcodes(rows):
+    """
+    Insert or refresh registry rows in a single statement
+
+    Existing serial entries are kept when a non-serial row uses the same barcode.
+
+    Args:
+        rows (list): dicts with barcode, item_code and optional serial_no, batch_no, uom, source
+    """
+    rows = [row for row in rows if row.get("barcode") and row.get("item_code")]
+    if not rows:
+        return
+
+    timestamp = now()
+    user = frappe.session.user
+    values = []
+    for row in rows:
+        values.append((
+            row["barcode"], row["barcode"], row["item_code"], row.get("serial_no"),
+            row.get("batch_no"), row.get("uom"), row.get("source") or "Custom",
+            timestamp, timestamp, user, user,
+        ))
+
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 0, 0)"] * len(values))
+    frappe.db.sql(f"""
+        INSERT INTO `tabBarcode Registry`
+            (name, barcode, item_code, serial_no, batch_no, uom, source,
+            creation, modified, owner, modified_by, docstatus, idx)
+        VALUES {placeholders}
+        {ON_DUPLICATE_UPDATE}
+    """, tuple(value for row in values for value in row))
+
+
+def register_serial_barcode(serial_no, item_code, barcode_string=None, batch_no=None):
+    """Register a serial number and its generated barcode string"""
+    rows = [{
+        "barcode": serial_no,
+        "item_code": item_code,
+        "serial_no": serial_no,
+        "batch_no": batch_no,
+        "source": "Serial No",
+    }]
+    if barcode_string and barcode_string != serial_no:
+        rows.append({
+            "barcode": barcode_string,
+            "item_code": item_code,
+            "serial_no": serial_no,
+            "batch_no": batch_no,
+            "source": "Serial Barcode",
+        })
+    register_barcodes(rows)
+
+
+@instrumented()
+def sync_item_barcodes(doc, method):
+    """Item on_update: mirror the Item Barcode child table into the registry"""
+    barcodes = [row.barcode for row in doc.get("barcodes") or [] if row.barcode]
+
+    # Drop barcodes removed from the item since the last sync
+    frappe.db.sql("""
+        DELETE FROM `tabBarcode Registry`
+        WHERE item_code = %(item_code)s AND source = 'Item Barcode'
+            AND name NOT IN %(keep)s
+    """, {"item_code": doc.name, "keep": tuple(barcodes) or ("",)})
+
+    register_barcodes([{
+        "barcode": row.barcode,
+        "item_code": doc.name,
+        "uom": row.get("uom") or doc.stock_uom,
+        "source": "Item Barcode",
+    } for row in doc.get("barcodes") or [] if row.barcode])
+
+
+@instrumented()
+def remove_item_barcodes(doc, method):
+    """Item on_trash: drop every registry row pointing at the item"""
+    frappe.db.delete("Barcode Registry", {"item_code": doc.name})
+
+
+@instrumented()
+def remove_serial_barcodes(doc, method):
+    """Serial No on_trash: drop the serial and its generated barcode"""
+    frappe.db.delete("Barcode Registry", {"serial_no": doc.name})
+
+
+@instrumented()
+def remove_generator_barcode(doc, method):
+    """
+    Item Barcode Generator on_trash: drop the registry row of the generated string
+
+    The row stays while its Serial No still carries the string. A string the
+    generator also added to the item's barcodes is handed back to the Item Barcode
+    source, as sync_item_barcodes would register it.
+    """
+    if not doc.barcode_string:
+        return
+
+    frappe.db.sql("""
+        DELETE r FROM `tabBarcode Registry` r
+        LEFT JOIN `tabSerial No` sn ON sn.name = r.serial_no
+        WHERE r.name = %s
+            AND r.source IN ('Custom', 'Serial Barcode')
+            AND IFNULL(sn.custom_barcode_string, '') != r.name
+    """, doc.barcode_string)
+
+    item_barcode = frappe.db.get_value("Item Barcode",
+        {"barcode": doc.barcode_string, "parenttype": "Item"}, ["parent", "uom"], as_dict=True)
+    if item_barcode:
+        register_barcodes([{
+            "barcode": doc.barcode_string,
+            "item_code": item_barcode.parent,
+            "uom": item_barcode.uom or frappe.db.get_value("Item", item_barcode.parent, "stock_uom"),
+            "source": "Item Barcode",
+        }])
+
+
+@frappe.whitelist()
+def rebuild_barcode_registry():
+    """API endpoint for rebuilding the barcode registry"""
+    frappe.only_for("System Manager")
+
+    count = build_barcode_registry()
+    return {
+        "success": True,
+        "count": count,
+        "message": _("Barcode registry rebuilt with {0} entries").format(count)
+    }
+
+
+def build_barcode_registry():
+    """Populate the registry from Item Barcodes and Serial Nos with set-based inserts"""
+    timestamp = now()
+    user = frappe.session.user
+    params = {"timestamp": timestamp, "user": user}
+    on_duplicate = ON_DUPLICATE_UPDATE
+
+    frappe.db.sql(f"""
+        INSERT INTO `tabBarcode Registry`
+            (name, barcode, item_code, serial_no, batch_no, uom, source,
+            creation, modified, owner, modified_by, docstatus, idx)
+        SELECT ib.barcode, ib.barcode, ib.parent, NULL, NULL, ib.uom, 'Item Barcode',
+            %(timestamp)s, %(timestamp)s, %(user)s, %(user)s, 0, 0
+        FROM `tabItem Barcode` ib
+        WHERE ib.parenttype = 'Item' AND IFNULL(ib.barcode, '') != ''
+        {on_duplicate}
+    """, params)
+
+    # Serials win over item barcodes on collision (see ON_DUPLICATE_UPDATE)
+    frappe.db.sql(f"""
+        INSERT INTO `tabBarcode Registry`
+            (name, barcode, item_code, serial_no, batch_no, uom, source,
+            creation, modified, owner, modified_by, docstatus, idx)
+        SELECT sn.name, sn.name, sn.item_code, sn.name, sn.batch_no, NULL, 'Serial No',
+            %(timestamp)s, %(timestamp)s, %(user)s, %(user)s, 0, 0
+        FROM `tabSerial No` sn
+        WHERE IFNULL(sn.item_code, '') != ''
+        {on_duplicate}
+    """, params)
+
+    frappe.db.sql(f"""
+        INSERT INTO `tabBarcode Registry`
+            (name, barcode, item_code, serial_no, batch_no, uom, source,
+            creation, modified, owner, modified_by, docstatus, idx)
+        SELECT sn.custom_barcode_string, sn.custom_barcode_string, sn.item_code, sn.name,
+            sn.batch_no, NULL, 'Serial Barcode',
+            %(timestamp)s, %(timestamp)s, %(user)s, %(user)s, 0, 0
+        FROM `tabSerial No` sn
+        WHERE IFNULL(sn.item_code, '') != ''
+            AND IFNULL(sn.custom_barcode_string, '') != ''
+            AND sn.custom_barcode_string != sn.name
+        {on_duplicate}
+    """, params)
+
+    return frappe.db.count("Barcode Registry")
@@ -0,0 +1,103 @@
+# Copyright (c) 2026, Qonevo and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from qonevo.qonevo.doctype.barcode_registry.barcode_registry import (
+	build_barcode_registry,
+	register_barcodes,
+	resolve_barcode,
+	resolve_barcodes,
+)
+
+TEST_ITEM = "_Test Qonevo Barcode Item"
+
+
+class TestBarcodeRegistry(FrappeTestCase):
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		if not frappe.db.exists("Item", TEST_ITEM):
+			frappe.get_doc({
+				"doctype": "Item",
+				"item_code": TEST_ITEM,
+				"item_name": TEST_ITEM,
+				"item_group": "All Item Groups",
+				"stock_uom": "Nos",
+				"barcodes": [{"barcode": "QNV-TEST-ITEM-0001"}],
+			}).insert(ignore_permissions=True)
+
+	def test_register_and_resolve(self):
+		register_barcodes([{"barcode": "QNV-TEST-CUSTOM-0001", "item_code": TEST_ITEM, "uom": "Nos"}])
+
+		row = resolve_barcode("QNV-TEST-CUSTOM-0001")
+		self.assertEqual(row.item_code, TEST_ITEM)
+		self.assertEqual(row.uom, "Nos")
+		self.assertEqual(row.source, "Custom")
+
+	def test_resolve_many_skips_unknown(self):
+		register_barcodes([{"barcode": "QNV-TEST-CUSTOM-0002", "item_code": TEST_ITEM}])
+
+		result = resolve_barcodes(["QNV-TEST-CUSTOM-0002", "QNV-TEST-UNKNOWN", None, ""])
+		self.assertEqual(list(result), ["QNV-TEST-CUSTOM-0002"])
+		self.assertIsNone(resolve_barcode("QNV-TEST-UNKNOWN"))
+
+	def test_register_refreshes_existing_row(self):
+		register_barcodes([{"barcode": "QNV-TEST-CUSTOM-0003", "item_code": TEST_ITEM, "batch_no": None}])
+		register_barcodes([{"barcode": "QNV-TEST-CUSTOM-0003", "item_code": TEST_ITEM, "batch_no": "QNV-BATCH"}])
+
+		self.assertEqual(resolve_barcode("QNV-TEST-CUSTOM-0003").batch_no, "QNV-BATCH")
+
+	def test_item_barcode_does_not_override_serial(self):
+		register_barcodes([{
+			"barcode": "QNV-TEST-SN-0001",
+			"item_code": TEST_ITEM,
+			"serial_no": "QNV-TEST-SN-0001",
+			"source": "Serial No",
+		}])
+		register_barcodes([{"barcode": "QNV-TEST-SN-0001", "item_code": TEST_ITEM, "source": "Item Barcode"}])
+
+		row = resolve_barcode("QNV-TEST-SN-0001")
+		self.assertEqual(row.source, "Serial No")
+		self.assertEqual(row.serial_no, "QNV-TEST-SN-0001")
+
+	def test_build_mirrors_item_barcodes(self):
+		frappe.db.delete("Barcode Registry", {"name": "QNV-TEST-ITEM-0001"})
+
+		self.assertGreater(build_barcode_registry(), 0)
+		row = resolve_barcode("QNV-TEST-ITEM-0001")
+		self.assertEqual(row.item_code, TEST_ITEM)
+		self.assertEqual(row.source, "Item Barcode")
+
+	def test_generator_trash_removes_its_barcode(self):
+		generator = make_barcode_generator("QNV-GEN-0001")
+		self.assertEqual(resolve_barcode(generator.barcode_string).source, "Custom")
+
+		# Without the item barcode the generated string has no other owner
+		item = frappe.get_doc("Item", TEST_ITEM)
+		item.barcodes = [row for row in item.barcodes if row.barcode != generator.barcode_string]
+		item.save(ignore_permissions=True)
+
+		generator.delete(ignore_permissions=True)
+		self.assertIsNone(resolve_barcode(generator.barcode_string))
+
+	def test_generator_trash_keeps_item_barcode(self):
+		generator = make_barcode_generator("QNV-GEN-0002")
+		generator.delete(ignore_permissions=True)
+
+		row = resolve_barcode(generator.barcode_string)
+		self.assertEqual(row.item_code, TEST_ITEM)
+		self.assertEqual(row.source, "Item Barcode")
+
+
+def make_barcode_generator(model_number):
+	title = f"{TEST_ITEM} - {model_number}"
+	frappe.delete_doc_if_exists("Item Barcode Generator", title)
+	return frappe.get_doc({
+		"doctype": "Item Barcode Generator",
+		"title": title,
+		"item_code": TEST_ITEM,
+		"model_number": model_number,
+		"barcode_type": "CODE128",
+	}).insert(ignore_permissions=True)
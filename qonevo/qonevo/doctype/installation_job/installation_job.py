@@ -5,6 +5,9 @@ import frappe
 from frappe import _
 from frappe.model.document import Document
 
+from qonevo.db_utils import execute_and_count
+from qonevo.warranty_engine import create_job_warranties
+
 
 class InstallationJob(Document):
     def before_save(self):
@@ -22,12 +25,18 @@ class InstallationJob(Document):
     
     def validate(self):
         """Validate Installation Job data"""
+        # Items may have changed since the last save; recount once for this save cycle
+        self.flags.installation_summary = None
         self.validate_installation_items()
         self.validate_photos_and_signature()
         self.calculate_summary()
     
     def validate_installation_items(self):
         """Validate that installation items are properly configured"""
+        # Rows written with bulk insert after the parent (see installation_job_hooks)
+        if self.flags.items_bulk_inserted:
+            return
+        
         if not self.installed_items:
             frappe.throw(_("At least one item must be added to the installation job"))
         
@@ -52,71 +61,38 @@ class InstallationJob(Document):
     
     def calculate_summary(self):
         """Calculate summary statistics"""
-        if not self.installed_items:
-            self.total_items = 0
-            self.installed_count = 0
-            self.not_installed_count = 0
-            self.completion_percentage = 0
+        if self.flags.items_bulk_inserted:
             return
         
-        self.total_items = len(self.installed_items)
-        self.installed_count = len([item for item in self.installed_items if item.installed == 1])
-        self.not_installed_count = self.total_items - self.installed_count
-        
-        if self.total_items > 0:
-            self.completion_percentage = (self.installed_count / self.total_items) * 100
-        else:
-            self.completion_percentage = 0
+        summary = self.get_summary()
+        self.total_items = summary.total
+        self.installed_count = summary.installed
+        self.not_installed_count = summary.not_installed
+        self.completion_percentage = summary.percentage
+    
+    def get_summary(self):
+        """Count installed items in one pass, cached on flags until the next validate"""
+        if self.flags.installation_summary is None:
+            total = len(self.installed_items)
+            installed = sum(1 for item in self.installed_items if item.installed == 1)
+            self.flags.installation_summary = frappe._dict(
+                total=total,
+                installed=installed,
+                not_installed=total - installed,
+                percentage=(installed / total) * 100 if total else 0
+            )
+        return self.flags.installation_summary
     
     def create_warranty_records_automatically(self):
         """Create warranty records automatically when status becomes completed"""
         try:
-            # Get Sales Order and Customer details
-            sales_order = frappe.get_doc("Sales Order", self.sales_order)
-            customer = frappe.get_doc("Customer", self.customer)
-            
-            warranty_created = 0
-            warranty_skipped = 0
+            result = create_job_warranties(self)
+            # Read by callers of save() that report how many warranties it created
+            self.flags.warranties_created = result.created
             
-            for item in self.installed_items:
-                if item.installed == 1:  # Only create warranty for installed items
-                    # Check if warranty record already exists
-                    existing_warranty = frappe.db.exists("Warranty Record", {
-                        "serial_no": item.serial_no,
-                        "installation_job": self.name
-                    })
-                    
-                    if existing_warranty:
-                        warranty_skipped += 1
-                        continue
-                    
-                    # Create new warranty record
-                    warranty_doc = frappe.new_doc("Warranty Record")
-                    warranty_doc.serial_no = item.serial_no
-                    warranty_doc.item = item.item
-                    warranty_doc.item_name = item.item_name
-                    warranty_doc.customer = self.customer
-                    warranty_doc.customer_name = customer.customer_name
-                    warranty_doc.sales_order = self.sales_order
-                    warranty_doc.delivery_note = self.delivery_note
-                    warranty_doc.installation_job = self.name
-                    warranty_doc.start_date = self.installation_date or frappe.utils.today()
-                    warranty_doc.warranty_period = 3  # Default 3 years
-                    warranty_doc.warranty_type = "Standard"
-                    warranty_doc.warranty_terms = "Standard warranty terms apply"
-                    warranty_doc.status = "Active"
-                    
-                    # Calculate end date
-                    warranty_doc.end_date = frappe.utils.add_years(warranty_doc.start_date, warranty_doc.warranty_period)
-                    
-                    warranty_doc.insert(ignore_permissions=True)
-                    warranty_created += 1
-                else:
-                    warranty_skipped += 1
-            
-            if warranty_created > 0:
+            if result.created > 0:
                 frappe.msgprint(
-                    _("Created {0} warranty records automatically").format(warranty_created),
+                    _("Created {0} warranty records automatically").format(result.created),
                     title=_("Warranty Records Created"),
                     indicator="green"
                 )
@@ -157,7 +133,7 @@ class InstallationJob(Document):
         self.validate_photos_and_signature()
         
         # Determine completion type based on installed items
-        installed_count = len([item for item in self.installed_items if item.installed == 1])
+        installed_count = self.get_summary().installed
         if installed_count == self.total_items:
             self.status = "Completed - Full"
         else:
@@ -203,40 +179,23 @@ class InstallationJob(Document):
             )
             return
         
-        warranty_created = 0
-        warranty_skipped = 0
-        
-        for item in self.installed_items:
-            if item.installed == 1:
-                # Create warranty record
-                warranty_doc = frappe.new_doc("Warranty Record")
-                warranty_doc.serial_no = item.serial_no
-                warranty_doc.item = item.item
-                warranty_doc.customer = self.customer
-                warranty_doc.sales_order = self.sales_order
-                warranty_doc.delivery_note = self.delivery_note
-                warranty_doc.installation_job = self.name
-                warranty_doc.start_date = self.installation_date or frappe.utils.today()
-                
-                # Calculate end date (assuming 3 years warranty)
-                warranty_doc.end_date = frappe.utils.add_years(warranty_doc.start_date, 3)
-                
-                warranty_doc.insert(ignore_permissions=True)
-                warranty_created += 1
-            else:
-                warranty_skipped += 1
-        
-        frappe.db.commit()
+        result = create_job_warranties(self)
         
         frappe.msgprint(
             _("Created {0} warranty records, skipped {1} uninstalled items").format(
-                warranty_created, warranty_skipped
+                result.created, result.skipped
             ),
             title=_("Warranty Records Created"),
             indicator="green"
         )
 
 
+def on_doctype_update():
+    """Indexes for the installer work queue and delta sync (qonevo.installer_api)"""
+    frappe.db.add_index("Installation Job", ["assigned_installer", "status", "installation_date"])
+    frappe.db.add_index("Installation Job", ["assigned_installer", "modified"])
+
+
 @frappe.whitelist()
 def start_installation(installation_job):
     """Start installation - called by installer"""
@@ -267,56 +226,13 @@ def create_warranty_records(installation_job):
                 "error": _("Warranty records can only be created for completed installation jobs")
             }
         
-        # Get Sales Order and Customer details
-        sales_order = frappe.get_doc("Sales Order", doc.sales_order)
-        customer = frappe.get_doc("Customer", doc.customer)
-        
-        warranty_created = 0
-        warranty_skipped = 0
-        
-        for item in doc.installed_items:
-            if item.installed == 1:  # Only create warranty for installed items
-                # Check if warranty record already exists
-                existing_warranty = frappe.db.exists("Warranty Record", {
-                    "serial_no": item.serial_no,
-                    "installation_job": installation_job
-                })
-                
-                if existing_warranty:
-                    warranty_skipped += 1
-                    continue
-                
-                # Create new warranty record
-                warranty_doc = frappe.new_doc("Warranty Record")
-                warranty_doc.serial_no = item.serial_no
-                warranty_doc.item = item.item
-                warranty_doc.item_name = item.item_name
-                warranty_doc.customer = doc.customer
-                warranty_doc.customer_name = customer.customer_name
-                warranty_doc.sales_order = doc.sales_order
-                warranty_doc.delivery_note = doc.delivery_note
-                warranty_doc.installation_job = installation_job
-                warranty_doc.start_date = doc.installation_date or frappe.utils.today()
-                warranty_doc.warranty_period = 3  # Default 3 years
-                warranty_doc.warranty_type = "Standard"
-                warranty_doc.warranty_terms = "Standard warranty terms apply"
-                warranty_doc.status = "Active"
-                
-                # Calculate end date
-                warranty_doc.end_date = frappe.utils.add_years(warranty_doc.start_date, warranty_doc.warranty_period)
-                
-                warranty_doc.insert(ignore_permissions=True)
-                warranty_created += 1
-            else:
-                warranty_skipped += 1
-        
-        frappe.db.commit()
+        result = create_job_warranties(doc)
         
         return {
             "success": True,
-            "count": warranty_created,
+            "count": result.created,
             "message": _("Created {0} warranty records, skipped {1} uninstalled items").format(
-                warranty_created, warranty_skipped
+                result.created, result.skipped
             )
         }
         
@@ -351,8 +267,8 @@ def complete_installation(installation_job, installer_notes=None):
     
     # Status should already be set by the frontend based on installation checkboxes
     # Just ensure it's in a completed state
-    installed_count = len([item for item in doc.installed_items if item.installed == 1])
-    if installed_count == doc.total_items:
+    summary = doc.get_summary()
+    if summary.installed == summary.total:
         doc.status = "Completed - Full"
     else:
         doc.status = "Completed - Partial"
@@ -407,3 +323,51 @@ def close_installation_job(installation_job):
         "success": True,
         "message": _("Installation job {0} closed successfully").format(installation_job)
     }
+
+
+@frappe.whitelist()
+def recompute_installation_job_summaries(installation_job=None):
+    """
+    Refresh the summary fields of all (or one) Installation Jobs from their item rows.
+
+    One UPDATE ... JOIN over a grouped count of Installation Job Items; use it after
+    bulk imports that write item rows directly. Only jobs whose counts change are
+    updated, and their modified is bumped so installer delta sync picks them up.
+    Can be run with `bench --site <site> execute qonevo.qonevo.doctype.installation_job.installation_job.recompute_installation_job_summaries`.
+    """
+    frappe.only_for("System Manager")
+    
+    job_condition = "AND j.name = %(installation_job)s" if installation_job else ""
+    item_condition = "AND parent = %(installation_job)s" if installation_job else ""
+    
+    updated = execute_and_count(f"""
+        UPDATE `tabInstallation Job` j
+        LEFT JOIN (
+            SELECT parent, COUNT(*) AS total, SUM(installed = 1) AS installed
+            FROM `tabInstallation Job Item`
+            WHERE parenttype = 'Installation Job' AND parentfield = 'installed_items' {item_condition}
+            GROUP BY parent
+        ) c ON c.parent = j.name
+        SET j.total_items = IFNULL(c.total, 0),
+            j.installed_count = IFNULL(c.installed, 0),
+            j.not_installed_count = IFNULL(c.total, 0) - IFNULL(c.installed, 0),
+            j.completion_percentage = IF(IFNULL(c.total, 0) > 0, c.installed * 100 / c.total, 0),
+            j.modified = %(timestamp)s,
+            j.modified_by = %(user)s
+        WHERE NOT (
+                j.total_items <=> IFNULL(c.total, 0)
+                AND j.installed_count <=> IFNULL(c.installed, 0)
+                AND j.not_installed_count <=> IFNULL(c.total, 0) - IFNULL(c.installed, 0)
+            )
+            {job_condition}
+    """, {
+        "installation_job": installation_job,
+        "timestamp": frappe.utils.now(),
+        "user": frappe.session.user
+    })
+    
+    return {
+        "success": True,
+        "updated": updated,
+        "message": _("Recomputed summaries of {0} installation jobs").format(updated)
+    }
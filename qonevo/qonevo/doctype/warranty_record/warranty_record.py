@@ -1,9 +1,21 @@
 # Copyright (c) 2025, Qonevo and contributors
 # For license information, please see license.txt
 
+import json
+
 import frappe
 from frappe import _
 from frappe.model.document import Document
+from frappe.utils import cint, getdate, today
+
+# Short-lived per-serial cache for get_warranty_coverage. Writers clear the serials
+# they change; the daily expiry sweep does not, so covered is recomputed from the
+# cached status and end_date on every read
+COVERAGE_CACHE_KEY = "qonevo:warranty_coverage"
+COVERAGE_CACHE_TTL = 300
+MAX_LOOKUP_SERIALS = 1000
+COVERAGE_FIELDS = ("name", "serial_no", "item", "customer", "delivery_note",
+    "start_date", "end_date", "status", "warranty_type")
 
 
 class WarrantyRecord(Document):
@@ -35,9 +47,15 @@ class WarrantyRecord(Document):
     
     def on_update(self):
         """Handle status changes"""
+        previous = self.get_doc_before_save()
+        clear_warranty_coverage_cache([self.serial_no, previous and previous.serial_no])
         if self.has_value_changed("status"):
             self.handle_status_change()
     
+    def on_trash(self):
+        """Drop the cached coverage of the serial"""
+        clear_warranty_coverage_cache([self.serial_no])
+    
     def handle_status_change(self):
         """Handle warranty status changes"""
         if self.status == "Expired":
@@ -54,6 +72,13 @@ class WarrantyRecord(Document):
             )
 
 
+def on_doctype_update():
+    """Indexes for the daily expiry sweep and the bulk coverage lookup"""
+    frappe.db.add_index("Warranty Record", ["status", "end_date"])
+    for fieldname in ("serial_no", "customer", "delivery_note"):
+        frappe.db.add_index("Warranty Record", [fieldname])
+
+
 @frappe.whitelist()
 def get_warranty_status(serial_no):
     """Get warranty status for a serial number"""
@@ -91,3 +116,124 @@ def extend_warranty(warranty_record, additional_years):
         "success": True,
         "message": _("Warranty {0} extended by {1} years").format(warranty_record, additional_years)
     }
+
+
+@frappe.whitelist()
+def get_warranty_coverage(serial_nos=None, customer=None, delivery_note=None, use_cache=0):
+    """
+    Warranty coverage for many serials at once
+
+    Exactly one of serial_nos, customer or delivery_note selects the warranties;
+    all of them are answered with one indexed query.
+
+    Args:
+        serial_nos (list): Serial numbers (JSON list accepted), at most MAX_LOOKUP_SERIALS
+        customer (str): Every warranty of a customer
+        delivery_note (str): Every warranty of a Delivery Note
+        use_cache (bool): Serve serial lookups from a short-lived per-serial cache
+
+    Returns:
+        dict: serial_no -> coverage dict, in the shape of get_warranty_status plus
+            item, customer and covered (Active and not past its end date)
+    """
+    frappe.has_permission("Warranty Record", "read", throw=True)
+
+    if isinstance(serial_nos, str):
+        serial_nos = json.loads(serial_nos)
+
+    if serial_nos:
+        serial_nos = list(dict.fromkeys(s.strip() for s in serial_nos if s and s.strip()))
+        if len(serial_nos) > MAX_LOOKUP_SERIALS:
+            frappe.throw(_("Cannot look up more than {0} serial numbers at once").format(MAX_LOOKUP_SERIALS))
+        return _get_serial_coverage(serial_nos, cint(use_cache))
+
+    if customer:
+        filters = {"customer": customer}
+    elif delivery_note:
+        filters = {"delivery_note": delivery_note}
+    else:
+        frappe.throw(_("Pass serial numbers, a customer or a Delivery Note"))
+
+    return _build_coverage(_fetch_warranties(filters))
+
+
+def _get_serial_coverage(serial_nos, use_cache):
+    coverage = {}
+    missing = serial_nos
+    if use_cache:
+        cache = frappe.cache()
+        cached = cache.mget([cache.make_key(f"{COVERAGE_CACHE_KEY}:{serial_no}") for serial_no in serial_nos])
+        missing = []
+        for serial_no, value in zip(serial_nos, cached, strict=True):
+            if value is None:
+                missing.append(serial_no)
+            else:
+                value = json.loads(value)
+                if value.get("has_warranty"):
+                    value["covered"] = _is_covered(value["status"], value["end_date"])
+                coverage[serial_no] = value
+
+    if missing:
+        found = _build_coverage(_fetch_warranties({"serial_no": ["in", missing]}))
+        fetched = {serial_no: found.get(serial_no) or {"has_warranty": False} for serial_no in missing}
+        coverage.update(fetched)
+
+        if use_cache:
+            pipe = cache.pipeline()
+            for serial_no, value in fetched.items():
+                pipe.setex(cache.make_key(f"{COVERAGE_CACHE_KEY}:{serial_no}"), COVERAGE_CACHE_TTL,
+                    json.dumps(value, default=str))
+            pipe.execute()
+
+    return {serial_no: coverage[serial_no] for serial_no in serial_nos}
+
+
+def _fetch_warranties(filters):
+    filters = dict(filters, status=["!=", "Cancelled"])
+    return frappe.get_all("Warranty Record", filters=filters, fields=list(COVERAGE_FIELDS),
+        order_by="end_date desc")
+
+
+def _build_coverage(warranties):
+    """Pick, per serial, the warranty that covers it longest"""
+    current = getdate(today())
+    coverage = {}
+    for warranty in warranties:
+        covered = _is_covered(warranty.status, warranty.end_date, current)
+        best = coverage.get(warranty.serial_no)
+        # Rows arrive latest end date first; a covering warranty wins over an earlier expired one
+        if best and (best["covered"] or not covered):
+            continue
+        coverage[warranty.serial_no] = {
+            "has_warranty": True,
+            "covered": covered,
+            "warranty_name": warranty.name,
+            "start_date": warranty.start_date,
+            "end_date": warranty.end_date,
+            "status": warranty.status,
+            "warranty_type": warranty.warranty_type,
+            "item": warranty.item,
+            "customer": warranty.customer,
+            "delivery_note": warranty.delivery_note,
+        }
+    return coverage
+
+
+def _is_covered(status, end_date, current=None):
+    """Active and not past its end date"""
+    return status == "Active" and (not end_date or getdate(end_date) >= (current or getdate(today())))
+
+
+def clear_warranty_coverage_cache(serial_nos):
+    """
+    Drop cached coverage of the given serials, now and again after commit
+
+    The second delete removes values a concurrent lookup cached from the
+    pre-commit rows.
+    """
+    keys = [frappe.cache().make_key(f"{COVERAGE_CACHE_KEY}:{serial_no}") for serial_no in serial_nos if serial_no]
+    if not keys:
+        return
+
+    frappe.cache().delete(*keys)
+    frappe.db.after_commit.add(lambda: frappe.cache().delete(*keys))
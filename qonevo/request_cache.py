@@ -0,0 +1,31 @@
+# Copyright (c) 2026, Qonevo and contributors
+# For license information, please see license.txt
+
+"""
+Per-request memo stores on ``frappe.local``.
+
+``frappe.local`` is reset at the start of every request and background job, so
+values kept here never outlive the request that loaded them. Helpers that memoize
+lookups for the rest of a request share ``get_request_cache`` instead of each
+managing their own attribute.
+"""
+
+import frappe
+
+
+def get_request_cache(name, factory=dict):
+    """
+    Store kept on frappe.local for the rest of the request
+
+    Args:
+        name (str): Attribute name on frappe.local, e.g. ``qonevo_link_chains``
+        factory: Callable creating the empty store on first use
+
+    Returns:
+        the store, shared by every caller using the same name in this request
+    """
+    store = getattr(frappe.local, name, None)
+    if store is None:
+        store = factory()
+        setattr(frappe.local, name, store)
+    return store
@@ -0,0 +1,262 @@
+# Copyright (c) 2026, Qonevo and contributors
+# For license information, please see license.txt
+
+"""
+Serial allocation for Delivery Notes created from Sales Orders.
+
+Delivery Note hooks (before_save, validate) and the populate_manufacturing_serials
+endpoint all need each referenced Sales Order's ``custom_manufactured_serials``
+grouped by item. A request-scoped index loads those rows once per request, for
+every Sales Order and item that is not indexed yet, with a single column-only
+query, ordered FIFO by manufacturing date.
+
+``allocate_serials`` hands out serials from that index, skipping serials that are
+already delivered or reserved by another (draft or submitted) Delivery Note and
+serials taken by earlier lines of the same note.
+"""
+
+import frappe
+from frappe.utils import cint
+
+from qonevo.request_cache import get_request_cache
+
+
+def get_sales_order_serials(sales_orders, item_codes=None):
+    """
+    Get manufactured serials grouped by item for each Sales Order
+
+    Args:
+        sales_orders (list): Sales Order names
+        item_codes (list): Only load serials of these items (default: every item)
+
+    Returns:
+        dict: sales_order -> {item_code: [serial_no, ...]} oldest manufacturing date first
+    """
+    index = _get_request_index()
+    loaded = index["loaded"]
+    serials = index["serials"]
+    sales_orders = [so for so in dict.fromkeys(sales_orders) if so]
+    if item_codes is not None:
+        item_codes = {item_code for item_code in item_codes if item_code}
+        if not item_codes:
+            return {so: serials.get(so, {}) for so in sales_orders}
+
+    # loaded[so] is None once every item of the Sales Order is indexed
+    missing = [
+        so for so in sales_orders
+        if so not in loaded or (loaded[so] is not None and (item_codes is None or not item_codes <= loaded[so]))
+    ]
+
+    if missing:
+        filters = {
+            "parenttype": "Sales Order",
+            "parentfield": "custom_manufactured_serials",
+            "parent": ["in", missing]
+        }
+        if item_codes is not None:
+            filters["item_code"] = ["in", list(item_codes)]
+
+        rows = frappe.get_all("Manufacturing Serials",
+            filters=filters,
+            fields=["parent", "item_code", "serial_no"],
+            order_by="parent asc, manufacturing_date asc, idx asc"
+        )
+
+        for sales_order in missing:
+            if item_codes is None:
+                serials[sales_order] = {}
+                loaded[sales_order] = None
+            else:
+                item_map = serials.setdefault(sales_order, {})
+                for item_code in item_codes:
+                    item_map.pop(item_code, None)
+                loaded[sales_order] = loaded.get(sales_order, set()) | item_codes
+
+        for row in rows:
+            if row.serial_no:
+                serials[row.parent].setdefault(row.item_code, []).append(row.serial_no)
+
+    return {so: serials.get(so, {}) for so in sales_orders}
+
+
+def get_item_serials(sales_order, item_code):
+    """Manufactured serials of one item on one Sales Order"""
+    if not sales_order:
+        return []
+    return get_sales_order_serials([sales_order], [item_code])[sales_order].get(item_code, [])
+
+
+def get_delivery_note_serial_index(doc):
+    """Load the index for the Sales Orders and items referenced by a Delivery Note"""
+    items = [item for item in doc.items if item.against_sales_order]
+    return get_sales_order_serials(
+        [item.against_sales_order for item in items],
+        [item.item_code for item in items]
+    )
+
+
+def get_delivery_note_serials(doc):
+    """
+    Serial numbers of every Delivery Note line, bundle entries read in one query
+
+    Returns:
+        dict: Delivery Note Item name -> [serial_no, ...]
+    """
+    bundles = {item.serial_and_batch_bundle: item.name for item in doc.items if item.serial_and_batch_bundle}
+    serials = {}
+
+    if bundles:
+        entries = frappe.get_all("Serial and Batch Entry",
+            filters={"parent": ["in", list(bundles)], "parenttype": "Serial and Batch Bundle"},
+            fields=["parent", "serial_no"],
+            order_by="parent asc, idx asc"
+        )
+        for entry in entries:
+            if entry.serial_no:
+                serials.setdefault(bundles[entry.parent], []).append(entry.serial_no)
+
+    for item in doc.items:
+        if not item.serial_and_batch_bundle and item.serial_no:
+            serials[item.name] = [s.strip() for s in item.serial_no.replace("\n", ",").split(",") if s.strip()]
+
+    return serials
+
+
+def allocate_serials(lines, delivery_note=None, lock=False):
+    """
+    Allocate manufactured serials to delivery lines, FIFO by manufacturing date
+
+    Args:
+        lines (list): dicts with key, against_sales_order, item_code, qty and
+            optionally serial_nos (serials already set on the line)
+        delivery_note (str): Delivery Note being allocated, its own reservations are ignored
+        lock (bool): lock the referenced Sales Orders so concurrent Delivery Note
+            saves allocate one after the other, and read reservations with locking
+            reads so drafts committed while waiting for the lock are seen
+
+    Returns:
+        dict: line key -> {"serial_nos": [...], "available": int, "required": int}
+            for every line whose item has manufactured serials on its Sales Order
+    """
+    lines = [line for line in lines if line.get("against_sales_order") and line.get("item_code")]
+    if not lines:
+        return {}
+
+    sales_orders = sorted({line["against_sales_order"] for line in lines})
+    if lock:
+        frappe.db.sql("""
+            SELECT name FROM `tabSales Order`
+            WHERE name IN %(sales_orders)s
+            ORDER BY name
+            FOR UPDATE
+        """, {"sales_orders": tuple(sales_orders)})
+
+    serial_index = get_sales_order_serials(sales_orders, [line["item_code"] for line in lines])
+    candidates = {
+        serial_no
+        for line in lines
+        for serial_no in serial_index[line["against_sales_order"]].get(line["item_code"], [])
+    }
+    unavailable = get_unavailable_serials(candidates, sales_orders, delivery_note, locking_read=lock)
+
+    taken = set()
+    allocations = {}
+    for line in lines:
+        manufactured = serial_index[line["against_sales_order"]].get(line["item_code"], [])
+        if not manufactured and not line.get("serial_nos"):
+            continue
+
+        # Lines whose serials are all taken are still returned, with available 0
+        available = [serial_no for serial_no in manufactured if serial_no not in unavailable]
+
+        required = cint(line.get("qty"))
+
+        # Keep serials already on the line when they are all still valid
+        current = line.get("serial_nos") or []
+        if current and len(current) == required and not taken.intersection(current) and set(current) <= set(available):
+            selected = list(current)
+        else:
+            selected = [serial_no for serial_no in available if serial_no not in taken][:required]
+
+        taken.update(selected)
+        allocations[line["key"]] = {
+            "serial_nos": selected,
+            "available": len(available),
+            "required": required
+        }
+
+    return allocations
+
+
+def get_unavailable_serials(serial_nos, sales_orders, delivery_note=None, locking_read=False):
+    """
+    Serials among serial_nos that are delivered, or reserved by another Delivery Note
+
+    Reservations are read from Delivery Note serial bundles and from the legacy
+    serial_no text of Delivery Note lines against the same Sales Orders, in one query.
+    Return Delivery Notes bring serials back and are not counted.
+
+    With locking_read, every branch is a locking read, which sees the latest
+    committed rows instead of the transaction's snapshot.
+    """
+    if not serial_nos:
+        return set()
+
+    lock = "LOCK IN SHARE MODE" if locking_read else ""
+    rows = frappe.db.sql(f"""
+        (SELECT sn.name AS serial_no
+        FROM `tabSerial No` sn
+        WHERE sn.name IN %(serial_nos)s
+            AND sn.status IN ('Delivered', 'Consumed', 'Expired')
+        {lock})
+
+        UNION ALL
+
+        (SELECT sbe.serial_no
+        FROM `tabSerial and Batch Entry` sbe
+        INNER JOIN `tabSerial and Batch Bundle` sbb ON sbb.name = sbe.parent
+        INNER JOIN `tabDelivery Note` dn ON dn.name = sbb.voucher_no
+        WHERE sbe.serial_no IN %(serial_nos)s
+            AND sbb.voucher_type = 'Delivery Note'
+            AND sbb.voucher_no != %(delivery_note)s
+            AND sbb.docstatus < 2
+            AND sbb.is_cancelled = 0
+            AND dn.is_return = 0
+        {lock})
+
+        UNION ALL
+
+        (SELECT dni.serial_no
+        FROM `tabDelivery Note Item` dni
+        INNER JOIN `tabDelivery Note` dn ON dn.name = dni.parent
+        WHERE dni.against_sales_order IN %(sales_orders)s
+            AND dn.name != %(delivery_note)s
+            AND dn.docstatus < 2
+            AND dn.is_return = 0
+            AND IFNULL(dni.serial_no, '') != ''
+        {lock})
+    """, {
+        "serial_nos": tuple(serial_nos),
+        "sales_orders": tuple(sales_orders),
+        "delivery_note": delivery_note or ""
+    })
+
+    unavailable = set()
+    for (value,) in rows:
+        unavailable.update(serial.strip() for serial in value.replace("\n", ",").split(",") if serial.strip())
+    return unavailable & set(serial_nos)
+
+
+def clear_sales_order_serials(sales_order=None):
+    """Drop one Sales Order (or all) from the request index after its serials change"""
+    index = _get_request_index()
+    if sales_order:
+        index["loaded"].pop(sales_order, None)
+        index["serials"].pop(sales_order, None)
+    else:
+        index["loaded"].clear()
+        index["serials"].clear()
+
+
+def _get_request_index():
+    return get_request_cache("qonevo_sales_order_serials", lambda: {"loaded": {}, "serials": {}})
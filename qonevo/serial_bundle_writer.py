@@ -0,0 +1,134 @@
+# Copyright (c) 2026, Qonevo and contributors
+# For license information, please see license.txt
+
+"""
+Set-based writer for draft Serial and Batch Bundle entries.
+
+Rewriting a bundle through ``Document.save`` loads and validates every entry and
+runs the bundle's full save cycle. Delivery Note hooks only need to swap the
+serials of a draft bundle, so this writer deletes the old entries, bulk inserts
+the new ones and recomputes the bundle totals in SQL, all inside the caller's
+transaction and under one savepoint, so a failure leaves the old entries in
+place. ERPNext still validates the bundle when the Delivery Note is submitted.
+
+Entries are written without a valuation rate. Outward valuation comes from the
+stock ledger and is filled in by the bundle's own valuation when the voucher is
+submitted; a selling rate must never be stored here.
+"""
+
+import time
+
+import frappe
+from frappe import _
+from frappe.utils import now
+
+ENTRY_FIELDS = (
+    "name", "parent", "parenttype", "parentfield", "idx",
+    "serial_no", "qty", "warehouse", "incoming_rate", "stock_value_difference", "is_outward",
+    "creation", "modified", "owner", "modified_by", "docstatus",
+)
+INSERT_CHUNK_SIZE = 1000
+BENCHMARK_SIZES = (1, 100, 1000)
+
+
+def rewrite_bundle_entries(bundle, serial_nos):
+    """
+    Replace the entries of a draft Serial and Batch Bundle with one row per serial
+
+    Does not commit; the caller's transaction owns the change. The entries are
+    rewritten under a savepoint and restored if any statement fails.
+
+    Args:
+        bundle (str): Serial and Batch Bundle name
+        serial_nos (list): Serial numbers, in entry order
+
+    Returns:
+        bool: False if the bundle does not exist or is no longer a draft
+    """
+    info = frappe.db.get_value("Serial and Batch Bundle", bundle,
+        ["type_of_transaction", "warehouse", "docstatus"], as_dict=True)
+    if not info or info.docstatus != 0:
+        return False
+
+    # Outward bundles carry negative quantities, as ERPNext writes them
+    is_outward = 1 if info.type_of_transaction == "Outward" else 0
+    qty = -1 if is_outward else 1
+
+    timestamp = now()
+    user = frappe.session.user
+    values = [(
+        frappe.generate_hash(length=10), bundle, "Serial and Batch Bundle", "entries", idx,
+        serial_no, qty, info.warehouse, 0, 0, is_outward,
+        timestamp, timestamp, user, user, 0,
+    ) for idx, serial_no in enumerate(serial_nos, start=1)]
+
+    frappe.db.savepoint("qonevo_bundle_rewrite")
+    try:
+        frappe.db.delete("Serial and Batch Entry", {
+            "parent": bundle,
+            "parenttype": "Serial and Batch Bundle"
+        })
+
+        if values:
+            frappe.db.bulk_insert("Serial and Batch Entry", ENTRY_FIELDS, values, chunk_size=INSERT_CHUNK_SIZE)
+
+        update_bundle_totals(bundle, timestamp, user)
+    except Exception:
+        frappe.db.rollback(save_point="qonevo_bundle_rewrite")
+        raise
+    return True
+
+
+def update_bundle_totals(bundle, timestamp=None, user=None):
+    """Recompute total_qty, total_amount and avg_rate of a bundle from its entries"""
+    frappe.db.sql("""
+        UPDATE `tabSerial and Batch Bundle` b
+        LEFT JOIN (
+            SELECT parent, SUM(qty) AS qty, SUM(stock_value_difference) AS amount
+            FROM `tabSerial and Batch Entry`
+            WHERE parent = %(bundle)s AND parenttype = 'Serial and Batch Bundle'
+            GROUP BY parent
+        ) e ON e.parent = b.name
+        SET b.total_qty = IFNULL(e.qty, 0),
+            b.total_amount = IFNULL(e.amount, 0),
+            b.avg_rate = IF(IFNULL(e.qty, 0) = 0, 0, e.amount / e.qty),
+            b.modified = %(timestamp)s,
+            b.modified_by = %(user)s
+        WHERE b.name = %(bundle)s
+    """, {"bundle": bundle, "timestamp": timestamp or now(), "user": user or frappe.session.user})
+
+
+@frappe.whitelist()
+def benchmark_bundle_writer(bundle, sizes=None):
+    """
+    Time rewrite_bundle_entries for 1, 100 and 1000 serials on a draft bundle
+
+    Every run is rolled back, so the bundle is left unchanged. Serial numbers are
+    synthetic; the writer does not validate them. Can be run with
+    `bench --site <site> execute qonevo.serial_bundle_writer.benchmark_bundle_writer --kwargs "{'bundle': '...'}"`.
+    """
+    frappe.only_for("System Manager")
+
+    sizes = frappe.parse_json(sizes) if sizes else BENCHMARK_SIZES
+    if frappe.db.get_value("Serial and Batch Bundle", bundle, "docstatus") != 0:
+        frappe.throw(_("Serial and Batch Bundle {0} must be a draft").format(bundle))
+
+    results = []
+    for size in sizes:
+        serial_nos = [f"QONEVO-BENCH-{i:06d}" for i in range(int(size))]
+
+        frappe.db.savepoint("qonevo_bundle_benchmark")
+        start = time.perf_counter()
+        try:
+            rewrite_bundle_entries(bundle, serial_nos)
+            elapsed = time.perf_counter() - start
+        finally:
+            frappe.db.rollback(save_point="qonevo_bundle_benchmark")
+
+        results.append({
+            "serials": int(size),
+            "seconds": round(elapsed, 4),
+            "serials_per_second": round(int(size) / elapsed, 1) if elapsed else None
+        })
+
+    return results
@@ -0,0 +1,152 @@
+# Copyright (c) 2026, Qonevo and contributors
+# For license information, please see license.txt
+
+"""
+Single Serial No hook pipeline.
+
+The work needed for a serial is decided once per save in ``validate`` and
+carried on ``doc.flags.qonevo_serial_plan``; later stages read the plan and the
+in-memory document instead of querying the database again. ``on_update`` drops
+the plan, so saving the same document object again plans afresh:
+
+- ``defaults``: fill model and size from Item defaults (every validate)
+- ``duplicate_check``: warn about an existing Item Barcode Generator record (new serials only)
+- ``barcode``: write the barcode string and register it (new serials, serials without
+  a barcode, or serials whose item changed)
+
+Each stage that actually runs is counted; counts are flushed to Redis once per
+committed transaction and can be read with ``get_serial_no_pipeline_stats``.
+"""
+
+import frappe
+from frappe import _
+
+from qonevo.barcode_utils import BarcodeUtils
+from qonevo.hook_metrics import get_counters, instrumented
+from qonevo.item_cache import get_item_attributes
+from qonevo.overrides.serial_no_handlers import apply_model_and_size_defaults
+from qonevo.qonevo.doctype.barcode_registry.barcode_registry import register_serial_barcode
+
+STATS_KEY = "qonevo:serial_no_pipeline_stats"
+STAGES = ("validate", "defaults", "duplicate_check", "barcode", "barcode_skipped")
+
+
+@instrumented()
+def validate(doc, method):
+    """Serial No validate: decide the plan for this save and apply item defaults"""
+    # A new save cycle; never reuse the plan of an earlier save of this object
+    doc.flags.qonevo_serial_plan = None
+    doc.flags.qonevo_barcode_done = False
+    plan = get_plan(doc)
+    _count("validate")
+
+    if plan.defaults:
+        apply_model_and_size_defaults([doc])
+        _count("defaults")
+
+
+@instrumented()
+def before_save(doc, method):
+    """Serial No before_save: warn when a barcode already exists for a new serial"""
+    plan = get_plan(doc)
+    if not plan.duplicate_check:
+        return
+
+    _count("duplicate_check")
+    if frappe.db.exists("Item Barcode Generator", {"serial_number": doc.name, "item_code": doc.item_code}):
+        frappe.msgprint(_("Barcode already exists for this serial number"))
+
+
+@instrumented()
+def on_update(doc, method):
+    """Serial No on_update (also fires on insert): generate the barcode once if planned"""
+    plan = get_plan(doc)
+    # The plan belongs to this save only
+    doc.flags.qonevo_serial_plan = None
+    if not plan.barcode or doc.flags.qonevo_barcode_done:
+        _count("barcode_skipped")
+        return
+
+    try:
+        generate_serial_barcode(doc)
+        _count("barcode")
+    except Exception as e:
+        frappe.logger().error(f"Error generating barcode for serial number {doc.name}: {str(e)}")
+
+
+def get_plan(doc):
+    """Return the pipeline plan of the current save, computing it on first use"""
+    if doc.flags.qonevo_serial_plan is None:
+        is_new = doc.is_new() or doc.flags.in_insert
+        doc.flags.qonevo_serial_plan = frappe._dict({
+            "defaults": bool(doc.item_code),
+            "duplicate_check": bool(is_new and doc.item_code),
+            "barcode": bool(doc.item_code and (
+                is_new
+                or not doc.get("custom_barcode_generated")
+                or doc.has_value_changed("item_code")
+            )),
+        })
+    return doc.flags.qonevo_serial_plan
+
+
+def generate_serial_barcode(doc):
+    """Write the barcode string for a serial without committing and register it"""
+    item = get_item_attributes(doc.item_code) or {}
+    model_number = item.get("default_manufacturer_part_no") or ""
+    barcode_string = BarcodeUtils.build_barcode_string(doc.item_code, model_number, doc.name)
+
+    frappe.db.sql("""
+        UPDATE `tabSerial No`
+        SET custom_barcode_string = %s, custom_barcode_generated = 1
+        WHERE name = %s
+    """, (barcode_string, doc.name))
+    register_serial_barcode(doc.name, doc.item_code, barcode_string, doc.get("batch_no"))
+
+    # Keep the in-memory document in step so later hooks need not re-read it
+    doc.custom_barcode_string = barcode_string
+    doc.custom_barcode_generated = 1
+    doc.flags.qonevo_barcode_done = True
+    return barcode_string
+
+
+def _count(stage):
+    """Count a stage run; counts are flushed to Redis after the transaction commits"""
+    counts = getattr(frappe.local, "qonevo_serial_pipeline_counts", None)
+    if counts is None:
+        counts = frappe.local.qonevo_serial_pipeline_counts = {}
+        frappe.db.after_commit.add(_flush_counts)
+        frappe.db.after_rollback.add(_discard_counts)
+    counts[stage] = counts.get(stage, 0) + 1
+
+
+def _flush_counts():
+    counts = getattr(frappe.local, "qonevo_serial_pipeline_counts", None) or {}
+    frappe.local.qonevo_serial_pipeline_counts = None
+
+    cache = frappe.cache()
+    key = cache.make_key(STATS_KEY)
+    for stage, count in counts.items():
+        cache.hincrby(key, stage, count)
+
+
+def _discard_counts():
+    frappe.local.qonevo_serial_pipeline_counts = None
+
+
+@frappe.whitelist()
+def get_serial_no_pipeline_stats():
+    """How often each Serial No pipeline stage actually ran"""
+    frappe.only_for("System Manager")
+
+    counts = get_counters([STATS_KEY])[0]
+    return {stage: counts.get(stage, 0) for stage in STAGES}
+
+
+@frappe.whitelist()
+def reset_serial_no_pipeline_stats():
+    """Reset the Serial No pipeline counters"""
+    frappe.only_for("System Manager")
+
+    frappe.cache().delete_value(STATS_KEY)
+    return {"success": True}
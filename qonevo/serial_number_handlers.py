@@ -1,128 +1,19 @@
 # Copyright (c) 2025, Qonevo and contributors
 # For license information, please see license.txt
 
+import time
+
 import frappe
 from frappe import _
+from frappe.utils import cint
 from qonevo.barcode_utils import BarcodeUtils
+from qonevo.item_cache import get_item_attributes_map
+from qonevo.qonevo.doctype.barcode_registry.barcode_registry import register_barcodes
+from qonevo.serial_no_pipeline import generate_serial_barcode
 
 
-def after_insert(doc, method):
-    """Generate barcode when serial number is created"""
-    try:
-        if doc.item_code and doc.name:
-            # Get item details
-            item_doc = frappe.get_doc("Item", doc.item_code)
-            model_number = item_doc.get("default_manufacturer_part_no") or ""
-            
-            # Generate barcode for this serial number
-            result = BarcodeUtils.generate_item_barcode(
-                item_code=doc.item_code,
-                model_number=model_number,
-                serial_number=doc.name,
-                barcode_type="CODE128"
-            )
-            
-            if result.get("success"):
-                # Update serial number with barcode info using direct SQL to avoid validation issues
-                frappe.db.sql("""
-                    UPDATE `tabSerial No` 
-                    SET custom_barcode_string = %s, custom_barcode_generated = 1
-                    WHERE name = %s
-                """, (result.get("barcode_string"), doc.name))
-                
-                frappe.db.commit()
-                
-                frappe.logger().info(f"Barcode generated for serial number {doc.name}: {result.get('barcode_string')}")
-                
-            else:
-                frappe.logger().error(f"Failed to generate barcode for serial number {doc.name}: {result.get('error')}")
-                
-    except Exception as e:
-        frappe.logger().error(f"Error generating barcode for serial number {doc.name}: {str(e)}")
-        import traceback
-        traceback.print_exc()
-
-
-def after_update(doc, method):
-    """Update barcode when serial number is updated"""
-    try:
-        if doc.item_code and doc.name and doc.has_value_changed("name"):
-            # Regenerate barcode if serial number changed
-            generate_barcode_for_serial(doc)
-            
-    except Exception as e:
-        frappe.logger().error(f"Error updating barcode for serial number {doc.name}: {str(e)}")
-
-
-def on_update(doc, method):
-    """Generate barcode when serial number is updated (alternative to after_insert)"""
-    try:
-        if doc.item_code and doc.name:
-            # Check if barcode already exists
-            existing_barcode = frappe.db.get_value("Serial No", doc.name, "custom_barcode_generated")
-            if not existing_barcode:
-                generate_barcode_for_serial(doc)
-                
-    except Exception as e:
-        frappe.logger().error(f"Error in on_update for serial number {doc.name}: {str(e)}")
-
-
-def generate_barcode_for_serial(doc):
-    """Generate barcode for a serial number document"""
-    try:
-        if doc.item_code and doc.name:
-            # Get item details
-            item_doc = frappe.get_doc("Item", doc.item_code)
-            model_number = item_doc.get("default_manufacturer_part_no") or ""
-            
-            # Generate barcode for this serial number
-            result = BarcodeUtils.generate_item_barcode(
-                item_code=doc.item_code,
-                model_number=model_number,
-                serial_number=doc.name,
-                barcode_type="CODE128"
-            )
-            
-            if result.get("success"):
-                # Update serial number with barcode info using direct SQL to avoid validation issues
-                frappe.db.sql("""
-                    UPDATE `tabSerial No` 
-                    SET custom_barcode_string = %s, custom_barcode_generated = 1
-                    WHERE name = %s
-                """, (result.get("barcode_string"), doc.name))
-                
-                frappe.db.commit()
-                
-                frappe.logger().info(f"Barcode generated for serial number {doc.name}: {result.get('barcode_string')}")
-                return True
-                
-            else:
-                frappe.logger().error(f"Failed to generate barcode for serial number {doc.name}: {result.get('error')}")
-                return False
-                
-    except Exception as e:
-        frappe.logger().error(f"Error generating barcode for serial number {doc.name}: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return False
-
-
-def before_save(doc, method):
-    """Validate serial number before saving"""
-    try:
-        # Check if this is a new serial number
-        if doc.is_new():
-            # Check if serial number already has a barcode
-            existing_barcode = frappe.db.exists("Item Barcode Generator", {
-                "serial_number": doc.name,
-                "item_code": doc.item_code
-            })
-            
-            if existing_barcode:
-                frappe.msgprint(_("Barcode already exists for this serial number"))
-                
-    except Exception as e:
-        frappe.logger().error(f"Error validating serial number {doc.name}: {str(e)}")
+# Serials written per chunk (and per commit) by the bulk barcode job
+SERIAL_BARCODE_CHUNK_SIZE = 500
 
 
 @frappe.whitelist()
@@ -141,7 +32,7 @@ def regenerate_serial_barcode(serial_number):
             frappe.delete_doc("Item Barcode Generator", existing_barcode)
         
         # Generate new barcode
-        after_insert(serial_doc, None)
+        generate_serial_barcode(serial_doc)
         
         return {"success": True, "message": f"Barcode regenerated for serial number {serial_number}"}
         
@@ -151,37 +42,127 @@ def regenerate_serial_barcode(serial_number):
 
 
 @frappe.whitelist()
-def bulk_generate_serial_barcodes(item_code=None):
-    """Generate barcodes for all serial numbers of an item or all items"""
+def bulk_generate_serial_barcodes(item_code=None, restart=0):
+    """Queue barcode generation for all serial numbers of an item or all items that have none yet"""
     try:
-        filters = {}
-        if item_code:
-            filters["item_code"] = item_code
-            
-        # Get all serial numbers
-        serial_numbers = frappe.get_all("Serial No", 
-            filters=filters,
-            fields=["name", "item_code"],
-            limit=1000  # Limit to prevent timeout
+        frappe.enqueue(
+            "qonevo.serial_number_handlers.generate_missing_serial_barcodes",
+            queue="long",
+            timeout=4 * 60 * 60,
+            job_id=f"qonevo_serial_barcodes::{item_code or 'all'}",
+            deduplicate=True,
+            item_code=item_code,
+            restart=cint(restart)
         )
         
-        generated_count = 0
-        error_count = 0
-        
-        for serial in serial_numbers:
-            try:
-                serial_doc = frappe.get_doc("Serial No", serial.name)
-                after_insert(serial_doc, None)
-                generated_count += 1
-            except Exception as e:
-                error_count += 1
-                frappe.logger().error(f"Error generating barcode for serial {serial.name}: {str(e)}")
-        
         return {
-            "success": True, 
-            "message": f"Generated {generated_count} barcodes, {error_count} errors"
+            "success": True,
+            "message": _("Barcode generation queued, progress will be shown as it runs")
         }
         
     except Exception as e:
         frappe.logger().error(f"Error in bulk barcode generation: {str(e)}")
         return {"success": False, "error": str(e)}
+
+
+def generate_missing_serial_barcodes(item_code=None, restart=False, chunk_size=SERIAL_BARCODE_CHUNK_SIZE):
+    """
+    Background job: generate barcode strings for serials missing custom_barcode_generated.
+    
+    Serials are walked in name order (keyset pagination) in chunks, each chunk written
+    with one UPDATE and one registry insert and then committed. The last processed name is
+    checkpointed so a restarted job resumes where the previous run stopped.
+    """
+    checkpoint_key = f"qonevo_serial_barcode_checkpoint::{item_code or 'all'}"
+    last_name = "" if restart else (frappe.db.get_global(checkpoint_key) or "")
+    
+    item_condition = "AND item_code = %(item_code)s" if item_code else ""
+    pending_condition = f"IFNULL(custom_barcode_generated, 0) = 0 AND IFNULL(item_code, '') != '' {item_condition}"
+    
+    total = frappe.db.sql(f"""
+        SELECT COUNT(*) FROM `tabSerial No`
+        WHERE {pending_condition} AND name > %(last_name)s
+    """, {"item_code": item_code, "last_name": last_name})[0][0]
+    
+    processed = 0
+    started_at = time.monotonic()
+    
+    while True:
+        serials = frappe.db.sql(f"""
+            SELECT name, item_code, batch_no
+            FROM `tabSerial No`
+            WHERE {pending_condition} AND name > %(last_name)s
+            ORDER BY name
+            LIMIT %(chunk_size)s
+        """, {"item_code": item_code, "last_name": last_name, "chunk_size": chunk_size}, as_dict=True)
+        
+        if not serials:
+            break
+        
+        write_serial_barcodes(serials)
+        
+        last_name = serials[-1].name
+        frappe.db.set_global(checkpoint_key, last_name)
+        frappe.db.commit()
+        
+        processed += len(serials)
+        rate = processed / max(time.monotonic() - started_at, 0.001)
+        frappe.publish_progress(
+            min(processed * 100 / (total or processed), 100),
+            title=_("Generating Serial Barcodes"),
+            description=_("{0} of {1} serials, {2} per second").format(processed, total, int(rate))
+        )
+    
+    # Finished: the next run starts from the beginning again
+    frappe.db.set_global(checkpoint_key, "")
+    frappe.db.commit()
+    
+    frappe.logger().info(f"Generated barcodes for {processed} serial numbers in {time.monotonic() - started_at:.1f}s")
+    return processed
+
+
+def write_serial_barcodes(serials):
+    """
+    Write barcode strings for a chunk of serials with a single UPDATE.
+    
+    Args:
+        serials (list): rows with name, item_code and batch_no
+    """
+    if not serials:
+        return
+    
+    items = get_item_attributes_map([serial.item_code for serial in serials])
+    
+    barcodes = {}
+    for serial in serials:
+        model_number = (items.get(serial.item_code) or {}).get("default_manufacturer_part_no") or ""
+        barcodes[serial.name] = BarcodeUtils.build_barcode_string(serial.item_code, model_number, serial.name)
+    
+    cases = " ".join(["WHEN %s THEN %s"] * len(barcodes))
+    placeholders = ", ".join(["%s"] * len(barcodes))
+    values = [value for pair in barcodes.items() for value in pair] + list(barcodes)
+    frappe.db.sql(f"""
+        UPDATE `tabSerial No`
+        SET custom_barcode_string = CASE name {cases} END,
+            custom_barcode_generated = 1
+        WHERE name IN ({placeholders})
+    """, values)
+    
+    registry_rows = []
+    for serial in serials:
+        registry_rows.append({
+            "barcode": serial.name,
+            "item_code": serial.item_code,
+            "serial_no": serial.name,
+            "batch_no": serial.batch_no,
+            "source": "Serial No"
+        })
+        if barcodes[serial.name] != serial.name:
+            registry_rows.append({
+                "barcode": barcodes[serial.name],
+                "item_code": serial.item_code,
+                "serial_no": serial.name,
+                "batch_no": serial.batch_no,
+                "source": "Serial Barcode"
+            })
+    register_barcodes(registry_rows)
@@ -3,141 +3,194 @@
 
 import frappe
 from frappe import _
+from frappe.utils import now
 
+from qonevo import tracing
+from qonevo.db_utils import execute_and_count
+from qonevo.hook_metrics import instrumented
+from qonevo.link_chain import get_link_chain
+from qonevo.serial_allocation import clear_sales_order_serials
 
-def add_manufacturing_serial(sales_order, serial_no, item_code, manufacturing_date):
+MANUFACTURING_SERIAL_FIELDS = (
+    "name", "parent", "parenttype", "parentfield", "idx", "serial_no", "item_code",
+    "manufacturing_date", "creation", "modified", "owner", "modified_by", "docstatus",
+)
+
+
+def add_manufacturing_serials(sales_order, item_code, serial_nos, manufacturing_date):
     """
-    Add a manufacturing serial to the sales order's custom_manufactured_serials table.
+    Add serials to a Sales Order's custom_manufactured_serials table in one pass
+
+    Existing rows are read with one IN query and the new rows bulk inserted after
+    the current last idx; custom_serials_added is set in the same transaction.
+    Does not commit.
+
+    Args:
+        sales_order (str): Sales Order name
+        item_code (str): Item of the serials
+        serial_nos (list): Serial numbers from the production bundle
+        manufacturing_date: Posting date of the manufacture entry
+
+    Returns:
+        int: number of rows added
     """
-    print(f"➕ MANUFACTURING SERIAL: Adding serial {serial_no} for item {item_code} to Sales Order {sales_order.name}")
-    
-    try:
-        # Check if the serial already exists
-        print(f"🔍 MANUFACTURING SERIAL: Checking if serial {serial_no} already exists")
-        existing_serial = frappe.db.exists("Manufacturing Serials", {
-            "parent": sales_order.name,
-            "parenttype": "Sales Order",
-            "parentfield": "custom_manufactured_serials",
-            "serial_no": serial_no,
-            "item_code": item_code
-        })
-        
-        if existing_serial:
-            print(f"⚠️ MANUFACTURING SERIAL: Serial {serial_no} already exists in Sales Order {sales_order.name}, skipping")
-            return
-        
-        # Create new manufacturing serial entry
-        print(f"📝 MANUFACTURING SERIAL: Creating new manufacturing serial entry")
-        manufacturing_serial = frappe.new_doc("Manufacturing Serials")
-        manufacturing_serial.parent = sales_order.name
-        manufacturing_serial.parenttype = "Sales Order"
-        manufacturing_serial.parentfield = "custom_manufactured_serials"
-        manufacturing_serial.serial_no = serial_no
-        manufacturing_serial.item_code = item_code
-        manufacturing_serial.manufacturing_date = manufacturing_date
-        
-        manufacturing_serial.insert(ignore_permissions=True)
-        frappe.db.commit()
-        
-        print(f"✅ MANUFACTURING SERIAL: Successfully added serial {serial_no} to Sales Order {sales_order.name}")
-        
-    except Exception as e:
-        print(f"❌ MANUFACTURING SERIAL: Error adding serial {serial_no}: {str(e)}")
-        frappe.logger().error(f"Error adding manufacturing serial {serial_no}: {str(e)}")
+    serial_nos = list(dict.fromkeys(serial_nos))
+    if not serial_nos:
+        return 0
+
+    # Serialise concurrent bundles of the same order on idx and the existence check
+    frappe.db.sql("SELECT name FROM `tabSales Order` WHERE name = %s FOR UPDATE", sales_order)
+
+    existing = set(frappe.db.sql_list("""
+        SELECT serial_no FROM `tabManufacturing Serials`
+        WHERE parent = %s AND parenttype = 'Sales Order' AND parentfield = 'custom_manufactured_serials'
+            AND item_code = %s AND serial_no IN %s
+    """, (sales_order, item_code, tuple(serial_nos))))
+
+    new_serials = [serial_no for serial_no in serial_nos if serial_no not in existing]
+    tracing.debug("Sales Order %s: %s new and %s existing serials for item %s",
+        sales_order, len(new_serials), len(existing), item_code)
+
+    if new_serials:
+        last_idx = frappe.db.sql("""
+            SELECT IFNULL(MAX(idx), 0) FROM `tabManufacturing Serials`
+            WHERE parent = %s AND parenttype = 'Sales Order' AND parentfield = 'custom_manufactured_serials'
+        """, sales_order)[0][0]
+        timestamp = now()
+        user = frappe.session.user
+
+        frappe.db.bulk_insert("Manufacturing Serials", MANUFACTURING_SERIAL_FIELDS, [(
+            frappe.generate_hash(length=10), sales_order, "Sales Order", "custom_manufactured_serials",
+            last_idx + offset, serial_no, item_code, manufacturing_date,
+            timestamp, timestamp, user, user, 0,
+        ) for offset, serial_no in enumerate(new_serials, start=1)])
+
+    frappe.db.sql("""
+        UPDATE `tabSales Order` SET custom_serials_added = 1
+        WHERE name = %s AND IFNULL(custom_serials_added, 0) != 1
+    """, sales_order)
 
+    clear_sales_order_serials(sales_order)
+    return len(new_serials)
 
+
+@instrumented()
+@tracing.traced()
 def serial_bundle_after_insert(doc, method):
     """
     Called when a Serial and Batch Bundle is created.
     This will trigger our manufacturing serials logic when serial numbers are created.
     """
-    print(f"🔧 SERIAL BUNDLE HOOK: serial_bundle_after_insert triggered for {doc.name}")
-    
     try:
         # Check if this bundle is related to a Stock Entry
         if not doc.voucher_type == "Stock Entry":
-            print(f"⏭️ SERIAL BUNDLE HOOK: Bundle {doc.name} is not for Stock Entry, skipping")
+            tracing.debug("Bundle %s is not for Stock Entry, skipping", doc.name)
             return
         
         stock_entry_name = doc.voucher_no
-        print(f"📋 SERIAL BUNDLE HOOK: Processing Serial Bundle {doc.name} for Stock Entry {stock_entry_name}")
-        
-        # Get the Stock Entry
-        if not frappe.db.exists("Stock Entry", stock_entry_name):
-            print(f"❌ SERIAL BUNDLE HOOK: Stock Entry {stock_entry_name} not found")
+        tracing.debug("Processing Serial Bundle %s for Stock Entry %s", doc.name, stock_entry_name)
+        
+        # Only the few columns used below, in one joined query
+        stock_entry_doc, work_order = get_link_chain(
+            "Stock Entry", stock_entry_name, ["purpose", "posting_date"],
+            ("work_order", "Work Order", ["sales_order"])
+        )
+        if not stock_entry_doc:
+            tracing.debug("Stock Entry %s not found", stock_entry_name)
             return
         
-        stock_entry_doc = frappe.get_doc("Stock Entry", stock_entry_name)
-        
         # Check if Stock Entry has work order
         if not stock_entry_doc.work_order:
-            print(f"⏭️ SERIAL BUNDLE HOOK: Stock Entry {stock_entry_name} has no work order, skipping")
+            tracing.debug("Stock Entry %s has no work order, skipping", stock_entry_name)
             return
         
         # Check if Stock Entry type is Manufacture (only process manufacturing serials)
         if stock_entry_doc.purpose != "Manufacture":
-            print(f"⏭️ SERIAL BUNDLE HOOK: Stock Entry {stock_entry_name} purpose is {stock_entry_doc.purpose}, not Manufacture - skipping")
+            tracing.debug("Stock Entry %s purpose is %s, not Manufacture - skipping", stock_entry_name, stock_entry_doc.purpose)
             return
         
-        print(f"🏭 SERIAL BUNDLE HOOK: Stock Entry {stock_entry_name} has Work Order {stock_entry_doc.work_order} and purpose is Manufacture")
+        tracing.debug("Stock Entry %s has Work Order %s and purpose is Manufacture", stock_entry_name, stock_entry_doc.work_order)
         
-        # Get Work Order and Sales Order
-        work_order = frappe.get_doc("Work Order", stock_entry_doc.work_order)
-        if not work_order.sales_order:
-            print(f"⏭️ SERIAL BUNDLE HOOK: Work Order {work_order.name} has no sales order, skipping")
+        if not work_order or not work_order.sales_order:
+            tracing.debug("Work Order %s has no sales order, skipping", stock_entry_doc.work_order)
             return
         
-        sales_order = frappe.get_doc("Sales Order", work_order.sales_order)
-        print(f"📦 SERIAL BUNDLE HOOK: Processing Sales Order {sales_order.name}")
-        
         # Process the serial bundle entries (only production bundles with positive qty)
         if doc.entries:
             # Check if this is a production bundle (positive qty or qty is None but has serials)
             is_production = False
             if doc.total_qty is not None and doc.total_qty > 0:
                 is_production = True
-                print(f"📦 SERIAL BUNDLE HOOK: Bundle has {len(doc.entries)} entries with positive qty {doc.total_qty} (production)")
+                tracing.debug("Bundle has %s entries with positive qty %s (production)", len(doc.entries), doc.total_qty)
             elif doc.total_qty is None:
                 # If qty is None, check if any entry has positive qty
                 for entry in doc.entries:
                     if entry.qty and entry.qty > 0:
                         is_production = True
-                        print(f"📦 SERIAL BUNDLE HOOK: Bundle has {len(doc.entries)} entries with None total_qty but positive entry qty (production)")
+                        tracing.debug("Bundle has %s entries with None total_qty but positive entry qty (production)", len(doc.entries))
                         break
             
             if is_production:
-                serials_found = False
-                for entry in doc.entries:
-                    if entry.serial_no:
-                        serials_found = True
-                        print(f"➕ SERIAL BUNDLE HOOK: Processing production serial {entry.serial_no}")
-                        
-                        # Use the item_code from the bundle
-                        item_code = doc.item_code
-                        print(f"📦 SERIAL BUNDLE HOOK: Serial {entry.serial_no} belongs to item {item_code}")
-                        
-                        # Add manufacturing serial
-                        add_manufacturing_serial(sales_order, entry.serial_no, item_code, stock_entry_doc.posting_date)
-                
-                if not serials_found:
-                    print(f"⏭️ SERIAL BUNDLE HOOK: No serial numbers found in production bundle entries")
+                serial_nos = [entry.serial_no for entry in doc.entries if entry.serial_no]
+                if serial_nos:
+                    add_manufacturing_serials(work_order.sales_order, doc.item_code, serial_nos, stock_entry_doc.posting_date)
+                else:
+                    tracing.debug("No serial numbers found in production bundle entries")
             else:
                 qty_info = doc.total_qty if doc.total_qty is not None else "None"
-                print(f"⏭️ SERIAL BUNDLE HOOK: Skipping bundle with qty {qty_info} (not production)")
-        else:
-            print(f"⏭️ SERIAL BUNDLE HOOK: No entries in bundle, skipping")
-        
-        # Update custom_serials_added checkbox
-        current_value = frappe.db.get_value("Sales Order", sales_order.name, "custom_serials_added")
-        if current_value != 1:
-            frappe.db.set_value("Sales Order", sales_order.name, "custom_serials_added", 1)
-            frappe.db.commit()
-            print(f"✅ SERIAL BUNDLE HOOK: Updated custom_serials_added to 1 for Sales Order {sales_order.name}")
+                tracing.debug("Skipping bundle with qty %s (not production)", qty_info)
         else:
-            print(f"ℹ️ SERIAL BUNDLE HOOK: custom_serials_added already set to 1 for Sales Order {sales_order.name}")
-        
-        print(f"🎉 SERIAL BUNDLE HOOK: Successfully processed Serial Bundle {doc.name}")
+            tracing.debug("No entries in bundle, skipping")
         
     except Exception as e:
-        print(f"❌ SERIAL BUNDLE HOOK: Error in serial_bundle_after_insert: {str(e)}")
-        frappe.logger().error(f"Error in serial_bundle_after_insert: {str(e)}")
\ No newline at end of file
+        frappe.logger().error(f"Error in serial_bundle_after_insert: {str(e)}")
+
+
+@instrumented()
+@tracing.traced()
+def stock_entry_on_cancel(doc, method):
+    """
+    Remove a cancelled manufacture entry's serials from its Sales Order
+
+    One DELETE ... JOIN keyed by the serials of the entry's inward bundles;
+    custom_serials_added is reset once the order has no serials left.
+    """
+    if doc.purpose != "Manufacture" or not doc.work_order:
+        return
+    
+    work_order = get_link_chain("Work Order", doc.work_order, ["sales_order"])[0]
+    if not work_order or not work_order.sales_order:
+        tracing.debug("Work Order %s has no sales order, skipping", doc.work_order)
+        return
+    
+    sales_order = work_order.sales_order
+    removed = execute_and_count("""
+        DELETE ms
+        FROM `tabManufacturing Serials` ms
+        JOIN `tabSerial and Batch Entry` sbe ON sbe.serial_no = ms.serial_no
+        JOIN `tabSerial and Batch Bundle` sbb ON sbb.name = sbe.parent AND sbb.item_code = ms.item_code
+        WHERE ms.parent = %(sales_order)s
+            AND ms.parenttype = 'Sales Order'
+            AND ms.parentfield = 'custom_manufactured_serials'
+            AND sbb.voucher_type = 'Stock Entry'
+            AND sbb.voucher_no = %(stock_entry)s
+            AND sbb.type_of_transaction = 'Inward'
+    """, {"sales_order": sales_order, "stock_entry": doc.name})
+    tracing.debug("Removed %s serials of Stock Entry %s from Sales Order %s", removed, doc.name, sales_order)
+    
+    if not removed:
+        return
+    
+    frappe.db.sql("""
+        UPDATE `tabSales Order` so
+        SET so.custom_serials_added = 0
+        WHERE so.name = %s
+            AND so.custom_serials_added = 1
+            AND NOT EXISTS (
+                SELECT 1 FROM `tabManufacturing Serials` ms
+                WHERE ms.parent = so.name AND ms.parenttype = 'Sales Order'
+                    AND ms.parentfield = 'custom_manufactured_serials'
+            )
+    """, sales_order)
+    
+    clear_sales_order_serials(sales_order)
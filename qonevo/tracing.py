@@ -0,0 +1,192 @@
+# Copyright (c) 2026, Qonevo and contributors
+# For license information, please see license.txt
+
+"""
+Leveled, sampled, structured tracing for qonevo hooks and endpoints.
+
+Tracing is configured per site in site_config.json:
+
+- ``qonevo_trace_level``: "off" (default), "info" or "debug"
+- ``qonevo_trace_sample_rate``: fraction of requests traced, 0 to 1 (default 1)
+
+Records are written as JSON lines to the ``qonevo.trace`` logger. Messages use
+%-style arguments and are only formatted when the record is actually emitted::
+
+    tracing.debug("Allocated %s serials for %s", len(serials), item_code)
+
+    with tracing.span("delivery_note_on_load", doc):
+        ...
+
+    @tracing.traced()
+    def delivery_note_on_submit(doc, method):
+        ...
+
+A span records the hook name, document, duration, and the number of SQL queries
+and rows it ran.
+"""
+
+import json
+import random
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import frappe
+from frappe.utils import flt
+
+LEVELS = {"off": 0, "info": 1, "debug": 2}
+
+
+def get_trace_level():
+    """Configured trace level of the current site, as a number"""
+    level = frappe.conf.get("qonevo_trace_level") or "off"
+    return LEVELS.get(str(level).lower(), 0)
+
+
+def is_enabled(level="info"):
+    """Whether records of this level are emitted for the current request"""
+    return get_trace_level() >= LEVELS[level] and _is_sampled()
+
+
+def info(message, *args, **fields):
+    """Emit an info record; message is formatted with args only if enabled"""
+    _emit("info", message, args, fields)
+
+
+def debug(message, *args, **fields):
+    """Emit a debug record; message is formatted with args only if enabled"""
+    _emit("debug", message, args, fields)
+
+
+@contextmanager
+def span(hook, doc=None, level="info"):
+    """
+    Time a block and emit a span record with its query and row counts
+
+    Args:
+        hook (str): Hook or endpoint name
+        doc: Document (or document name) the block works on
+        level (str): Level at which the span is recorded
+
+    Yields:
+        dict: the span record, to which callers may add fields; None when disabled
+    """
+    if not is_enabled(level):
+        yield None
+        return
+
+    record = {"span": hook, "doc": _describe_doc(doc)}
+    spans = _get_span_stack()
+    spans.append(record)
+
+    start = time.perf_counter()
+    try:
+        with count_queries() as stats:
+            yield record
+    except Exception as e:
+        record["error"] = str(e)
+        raise
+    finally:
+        spans.pop()
+        record["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        record["queries"] = stats.queries
+        record["rows"] = stats.rows
+        _write(level, record)
+
+
+def traced(hook=None, level="info"):
+    """Decorator that wraps a doc_events handler in a span named after it"""
+    def decorator(fn):
+        name = hook or fn.__name__
+
+        @wraps(fn)
+        def wrapper(doc, *args, **kwargs):
+            if not is_enabled(level):
+                return fn(doc, *args, **kwargs)
+            with span(name, doc, level):
+                return fn(doc, *args, **kwargs)
+
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def count_queries():
+    """
+    Count the SQL queries (and rows they returned or changed) run inside the block
+
+    ``frappe.db.sql`` is wrapped only while at least one counter is active, so
+    code outside a counted block runs unpatched.
+
+    Yields:
+        frappe._dict: with queries and rows, updated as the block runs
+    """
+    stats = frappe._dict(queries=0, rows=0)
+    counters = getattr(frappe.local, "qonevo_query_counters", None)
+    if counters is None:
+        counters = frappe.local.qonevo_query_counters = []
+
+    db = frappe.db
+    patched = not counters
+    if patched:
+        previous = db.__dict__.get("sql")
+        original = db.sql
+
+        def counting_sql(*args, **kwargs):
+            result = original(*args, **kwargs)
+            rows = max(getattr(db._cursor, "rowcount", 0) or 0, 0)
+            for counter in frappe.local.qonevo_query_counters:
+                counter.queries += 1
+                counter.rows += rows
+            return result
+
+        db.sql = counting_sql
+
+    counters.append(stats)
+    try:
+        yield stats
+    finally:
+        counters.remove(stats)
+        if patched:
+            if previous is None:
+                db.__dict__.pop("sql", None)
+            else:
+                db.sql = previous
+
+
+def _emit(level, message, args, fields):
+    if not is_enabled(level):
+        return
+
+    record = {"event": message % args if args else message}
+    spans = _get_span_stack()
+    if spans:
+        record["span"] = spans[-1]["span"]
+    record.update(fields)
+    _write(level, record)
+
+
+def _write(level, record):
+    record = {"level": level, **record}
+    frappe.logger("qonevo.trace").info(json.dumps(record, default=str))
+
+
+def _is_sampled():
+    # Decided once per request, so a request is traced completely or not at all
+    sampled = getattr(frappe.local, "qonevo_trace_sampled", None)
+    if sampled is None:
+        rate = flt(frappe.conf.get("qonevo_trace_sample_rate", 1))
+        sampled = frappe.local.qonevo_trace_sampled = random.random() < rate
+    return sampled
+
+
+def _get_span_stack():
+    if not hasattr(frappe.local, "qonevo_trace_spans"):
+        frappe.local.qonevo_trace_spans = []
+    return frappe.local.qonevo_trace_spans
+
+
+def _describe_doc(doc):
+    if doc is None or isinstance(doc, str):
+        return doc
+    return f"{doc.doctype}/{doc.name}" if getattr(doc, "doctype", None) else str(doc)
@@ -0,0 +1,355 @@
+# Copyright (c) 2026, Qonevo and contributors
+# For license information, please see license.txt
+
+"""
+Warranty Record creation and expiry for Installation Jobs.
+
+``create_job_warranties`` is the single path used when a job is completed,
+verified or when warranties are requested through the API. Existing
+warranties of the job are read with one IN query, names for the missing ones
+are reserved as one block of the naming series, and the records are bulk
+inserted. Calling it again for the same job creates nothing new.
+
+``expire_warranties`` runs daily and expires every Active warranty whose end
+date has passed in one UPDATE, using the (status, end_date) index.
+
+``bulk_extend_warranties`` extends many Active or Expired warranties (AMC
+renewals) with chunked UPDATEs that recompute ``end_date`` in SQL, reactivating
+the ones whose new end date has not passed, and leaves one audit comment per
+warranty.
+"""
+
+import json
+import time
+
+import frappe
+from frappe import _
+from frappe.model.naming import parse_naming_series
+from frappe.utils import add_years, cint, getdate, now, today
+
+from qonevo.audit import add_audit_comments
+from qonevo.db_utils import execute_and_count
+from qonevo.qonevo.doctype.warranty_record.warranty_record import clear_warranty_coverage_cache
+
+DEFAULT_WARRANTY_YEARS = 3
+DEFAULT_WARRANTY_TYPE = "Standard"
+DEFAULT_WARRANTY_TERMS = "Standard warranty terms apply"
+
+EXPIRY_RUN_KEY = "qonevo_warranty_expiry_last_run"
+# Customers listed individually in the expiry digest
+EXPIRY_DIGEST_TOP_CUSTOMERS = 20
+
+# Larger extensions (or background=1) run as a background job
+EXTENSION_SYNC_LIMIT = 200
+EXTENSION_CHUNK_SIZE = 500
+EXTENSION_PREVIEW_SIZE = 20
+WARRANTY_FIELDS = (
+    "name", "naming_series", "status", "serial_no", "item", "customer",
+    "sales_order", "delivery_note", "installation_job", "installation_date",
+    "start_date", "end_date", "warranty_period", "warranty_type", "warranty_terms",
+    "created_by_installation_job", "creation", "modified", "owner", "modified_by", "docstatus",
+)
+
+
+def create_job_warranties(job, start_date=None, warranty_period=DEFAULT_WARRANTY_YEARS):
+    """
+    Create the missing Warranty Records for the installed items of an Installation Job
+
+    Does not commit; the caller's transaction owns the records.
+
+    Args:
+        job: Installation Job document (its in-memory installed_items are used)
+        start_date: Warranty start (default: the job's installation date, else today)
+        warranty_period (int): Warranty length in years
+
+    Returns:
+        frappe._dict: created, existing (already had a warranty) and skipped (not installed)
+    """
+    installed = [row for row in job.installed_items if cint(row.installed) and row.serial_no]
+    result = frappe._dict(created=0, existing=0, skipped=len(job.installed_items) - len(installed))
+    if not installed:
+        return result
+
+    existing = set(frappe.db.sql_list("""
+        SELECT serial_no FROM `tabWarranty Record`
+        WHERE installation_job = %s AND serial_no IN %s
+    """, (job.name, tuple({row.serial_no for row in installed}))))
+
+    missing = []
+    for row in installed:
+        if row.serial_no in existing:
+            result.existing += 1
+            continue
+        existing.add(row.serial_no)
+        missing.append(row)
+
+    if not missing:
+        return result
+
+    start_date = getdate(start_date or job.installation_date or today())
+    end_date = add_years(start_date, warranty_period)
+    status = "Expired" if end_date < getdate(today()) else "Active"
+    timestamp = now()
+    user = frappe.session.user
+
+    naming_series = get_warranty_naming_series()
+    names = reserve_warranty_names(len(missing), naming_series)
+    frappe.db.bulk_insert("Warranty Record", WARRANTY_FIELDS, [(
+        name, naming_series, status, row.serial_no, row.item, job.customer,
+        job.sales_order, job.delivery_note, job.name, job.installation_date,
+        start_date, end_date, warranty_period, DEFAULT_WARRANTY_TYPE, DEFAULT_WARRANTY_TERMS,
+        1, timestamp, timestamp, user, user, 0,
+    ) for name, row in zip(names, missing, strict=True)])
+    clear_warranty_coverage_cache([row.serial_no for row in missing])
+
+    result.created = len(missing)
+    return result
+
+
+def get_warranty_naming_series():
+    """Default naming series of Warranty Record, the first option of its naming_series field"""
+    options = frappe.get_meta("Warranty Record").get_field("naming_series").options or ""
+    for option in options.split("\n"):
+        if option.strip():
+            return option.strip()
+    frappe.throw(_("Set a naming series for Warranty Record"))
+
+
+def reserve_warranty_names(count, naming_series):
+    """
+    Reserve a contiguous block of Warranty Record names from the naming series
+
+    Names are built the way Frappe names a document by naming series: the series
+    is extended with ``.#####``, its parts before the first ``#`` part are parsed
+    into the tabSeries key and that part's length gives the digits.
+    """
+    parts = f"{naming_series}.#####".split(".")
+    position = next(i for i, part in enumerate(parts) if part.startswith("#"))
+    prefix = parse_naming_series(parts[:position])
+    digits = len(parts[position])
+    suffix = parse_naming_series(parts[position + 1:]) if parts[position + 1:] else ""
+
+    current = frappe.db.sql("SELECT `current` FROM `tabSeries` WHERE `name` = %s FOR UPDATE", prefix)
+    if current:
+        start = cint(current[0][0])
+        frappe.db.sql("UPDATE `tabSeries` SET `current` = `current` + %s WHERE `name` = %s", (count, prefix))
+    else:
+        start = 0
+        frappe.db.sql("INSERT INTO `tabSeries` (`name`, `current`) VALUES (%s, %s)", (prefix, count))
+
+    return [f"{prefix}{number:0{digits}d}{suffix}" for number in range(start + 1, start + count + 1)]
+
+
+def expire_warranties():
+    """
+    Daily job: mark every Active warranty whose end date has passed as Expired
+
+    Writes a digest (per-customer counts) to the qonevo.warranty logger, emails
+    it to qonevo_warranty_expiry_recipients from site config if set, and records
+    the run under EXPIRY_RUN_KEY.
+
+    Returns:
+        int: number of warranties expired
+    """
+    as_of = today()
+    by_customer = frappe.db.sql("""
+        SELECT customer, COUNT(*) AS count
+        FROM `tabWarranty Record`
+        WHERE status = 'Active' AND end_date < %s
+        GROUP BY customer
+        ORDER BY count DESC
+    """, as_of, as_dict=True)
+
+    expired = 0
+    if by_customer:
+        expired = execute_and_count("""
+            UPDATE `tabWarranty Record`
+            SET status = 'Expired', modified = %s, modified_by = %s
+            WHERE status = 'Active' AND end_date < %s
+        """, (now(), frappe.session.user, as_of))
+
+    digest = {
+        "as_of": as_of,
+        "expired": expired,
+        "customers": [[row.customer, row.count] for row in by_customer[:EXPIRY_DIGEST_TOP_CUSTOMERS]],
+    }
+    frappe.logger("qonevo.warranty").info(json.dumps(digest, default=str))
+    frappe.db.set_global(EXPIRY_RUN_KEY, json.dumps(digest, default=str))
+
+    recipients = frappe.conf.get("qonevo_warranty_expiry_recipients")
+    if expired and recipients:
+        frappe.sendmail(
+            recipients=recipients,
+            subject=_("{0} warranties expired on {1}").format(expired, as_of),
+            message="<br>".join(
+                [_("{0} warranties expired.").format(expired)]
+                + [f"{customer}: {count}" for customer, count in digest["customers"]]
+            )
+        )
+
+    return expired
+
+
+def get_last_expiry_run():
+    """Digest of the last expire_warranties run, or None"""
+    value = frappe.db.get_global(EXPIRY_RUN_KEY)
+    return json.loads(value) if value else None
+
+
+@frappe.whitelist()
+def bulk_extend_warranties(additional_years, customer=None, item=None, sales_order=None,
+        expiring_from=None, expiring_to=None, dry_run=1, background=0):
+    """
+    Extend every Active or Expired warranty matching the filters by additional_years
+
+    Expired warranties whose new end date is today or later become Active again.
+
+    At least one of customer, item, sales_order or the expiry window
+    (expiring_from / expiring_to on end_date) is required.
+
+    Args:
+        additional_years (int): Years added to warranty_period
+        dry_run (bool): Only report what would change (default)
+        background (bool): Always run as a background job with progress updates
+
+    Returns:
+        dict: count and a preview of current and new end dates for a dry run,
+            otherwise count and whether the extension was queued
+    """
+    frappe.has_permission("Warranty Record", "write", throw=True)
+
+    additional_years = cint(additional_years)
+    if additional_years <= 0:
+        frappe.throw(_("Additional years must be a positive number"))
+
+    filters = {
+        "customer": customer,
+        "item": item,
+        "sales_order": sales_order,
+        "expiring_from": expiring_from,
+        "expiring_to": expiring_to,
+    }
+    conditions = _get_extension_conditions(filters)
+    params = dict(filters, years=additional_years, today=today())
+
+    count = frappe.db.sql(f"SELECT COUNT(*) FROM `tabWarranty Record` WHERE {conditions}", params)[0][0]
+
+    if cint(dry_run):
+        preview = frappe.db.sql(f"""
+            SELECT name, serial_no, customer, status, end_date AS current_end_date,
+                {_NEW_END_DATE} AS new_end_date
+            FROM `tabWarranty Record`
+            WHERE {conditions}
+            ORDER BY end_date
+            LIMIT {EXTENSION_PREVIEW_SIZE}
+        """, params, as_dict=True)
+        return {"dry_run": True, "count": count, "preview": preview}
+
+    if cint(background) or count > EXTENSION_SYNC_LIMIT:
+        batch = frappe.generate_hash(length=8)
+        frappe.enqueue(
+            "qonevo.warranty_engine.extend_warranties",
+            queue="long",
+            job_id=f"qonevo_warranty_extension::{batch}",
+            additional_years=additional_years,
+            filters=filters,
+            batch=batch,
+            commit=True
+        )
+        return {"dry_run": False, "count": count, "queued": True, "batch": batch}
+
+    extended = extend_warranties(additional_years, filters)
+    return {"dry_run": False, "count": extended, "queued": False}
+
+
+# Matches WarrantyRecord.calculate_end_date: start_date + the new warranty_period
+_NEW_END_DATE = """IF(start_date IS NULL,
+    DATE_ADD(end_date, INTERVAL %(years)s YEAR),
+    DATE_ADD(start_date, INTERVAL (IFNULL(warranty_period, 0) + %(years)s) YEAR))"""
+
+
+def extend_warranties(additional_years, filters, batch=None, commit=False,
+        chunk_size=EXTENSION_CHUNK_SIZE):
+    """
+    Extend matching Active or Expired warranties in name-ordered chunks
+
+    Each chunk is one UPDATE plus one bulk insert of audit comments. Background
+    runs commit and publish progress after every chunk.
+
+    Returns:
+        int: number of warranties extended
+    """
+    conditions = _get_extension_conditions(filters)
+    params = dict(filters, years=cint(additional_years), today=today(), last_name="", chunk_size=chunk_size)
+    batch = batch or frappe.generate_hash(length=8)
+    user = frappe.session.user
+
+    total = frappe.db.sql(f"SELECT COUNT(*) FROM `tabWarranty Record` WHERE {conditions}", params)[0][0]
+    processed = 0
+    started_at = time.monotonic()
+
+    while True:
+        rows = frappe.db.sql(f"""
+            SELECT name, serial_no, {_NEW_END_DATE} AS new_end_date
+            FROM `tabWarranty Record`
+            WHERE {conditions} AND name > %(last_name)s
+            ORDER BY name
+            LIMIT %(chunk_size)s
+        """, params, as_dict=True)
+        if not rows:
+            break
+
+        timestamp = now()
+        names = tuple(row.name for row in rows)
+        # status is assigned first so it is computed from the old end date and period
+        frappe.db.sql(f"""
+            UPDATE `tabWarranty Record`
+            SET status = IF({_NEW_END_DATE} >= %(today)s, 'Active', status),
+                end_date = {_NEW_END_DATE},
+                warranty_period = IFNULL(warranty_period, 0) + %(years)s,
+                modified = %(timestamp)s,
+                modified_by = %(user)s
+            WHERE name IN %(names)s
+        """, dict(params, names=names, timestamp=timestamp, user=user))
+
+        add_audit_comments("Warranty Record", {
+            row.name: _("Extended by {0} years to {1} (batch {2})").format(additional_years, row.new_end_date, batch)
+            for row in rows
+        }, timestamp)
+        clear_warranty_coverage_cache([row.serial_no for row in rows])
+
+        params["last_name"] = rows[-1].name
+        processed += len(rows)
+
+        if commit:
+            frappe.db.commit()
+            frappe.publish_progress(
+                min(processed * 100 / (total or processed), 100),
+                title=_("Extending Warranties"),
+                description=_("{0} of {1} warranties").format(processed, total)
+            )
+
+    frappe.logger("qonevo.warranty").info(json.dumps({
+        "event": "warranty_extension",
+        "batch": batch,
+        "years": cint(additional_years),
+        "extended": processed,
+        "seconds": round(time.monotonic() - started_at, 1),
+    }))
+    return processed
+
+
+def _get_extension_conditions(filters):
+    """WHERE clause for bulk_extend_warranties; values are bound from filters"""
+    conditions = ["status IN ('Active', 'Expired')"]
+    for fieldname in ("customer", "item", "sales_order"):
+        if filters.get(fieldname):
+            conditions.append(f"{fieldname} = %({fieldname})s")
+    if filters.get("expiring_from"):
+        conditions.append("end_date >= %(expiring_from)s")
+    if filters.get("expiring_to"):
+        conditions.append("end_date <= %(expiring_to)s")
+
+    if len(conditions) == 1:
+        frappe.throw(_("Select warranties by customer, item, sales order or expiry window"))
+    return " AND ".join(conditions)